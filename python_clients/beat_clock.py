@@ -0,0 +1,167 @@
+"""A tempo clock shared by all patterns: seconds, beats, bars and phase.
+
+Patterns are rendered for a time t.  A BeatClock turns the frame clock's
+seconds into a Time, which is still those seconds as a float, so every
+pattern that does arithmetic on t keeps working, but also carries the
+musical position:
+
+    beats = beat_clock.BeatClock(bpm=128)
+    while True:
+        t = beats.at(clock.tick())
+        t.beats     # beats since the show started, as a float
+        t.bar       # whole bars since the start
+        t.phase     # position in the current beat, 0 to 1
+        t.bar_phase # position in the current bar, 0 to 1
+        pixels = pattern.render(t)
+
+The tempo can be set, tapped, nudged and the downbeat reset while the
+show runs, from OSC:
+
+    beats.map_osc(dispatcher)      # an osc_dispatch.Dispatcher
+
+    /tempo/tap          a beat is now; a few taps in a row set the tempo
+    /tempo/bpm f        set the tempo
+    /tempo/nudge f      move the beat by f beats, say 0.02, to line it up
+    /tempo/reset        the downbeat of a bar is now
+
+A TouchOSC button sends 1 when pressed and 0 when released; the 0 is
+ignored.  Or it can follow a midi_input.MidiClock while that is running.
+
+The clock's state, anchor time, anchor beat and tempo, is one tuple
+replaced whole, so OSC handlers in another thread never leave the
+renderer a half-changed tempo.
+
+"""
+
+from __future__ import division
+import time
+
+MAX_TAPS = 8
+MAX_TAP_GAP = 2.0  # seconds; a longer pause starts a new run of taps
+
+
+class Time(float):
+    """Seconds since the show started, with the musical position attached."""
+
+    __slots__ = ('beats', 'bpm', 'beats_per_bar')
+
+    def __new__(cls, seconds, beats, bpm, beats_per_bar=4):
+        self = float.__new__(cls, seconds)
+        self.beats = beats
+        self.bpm = bpm
+        self.beats_per_bar = beats_per_bar
+        return self
+
+    @property
+    def seconds(self):
+        return float(self)
+
+    @property
+    def phase(self):
+        return self.beats % 1
+
+    @property
+    def bar(self):
+        return int(self.beats // self.beats_per_bar)
+
+    @property
+    def beat_in_bar(self):
+        """The whole beat within the current bar, from 0."""
+        return int(self.beats % self.beats_per_bar)
+
+    @property
+    def bar_phase(self):
+        return self.beats % self.beats_per_bar / self.beats_per_bar
+
+    def __repr__(self):
+        return 'Time(%r, beats=%r, bpm=%r)' % (float(self), self.beats, self.bpm)
+
+
+class BeatClock(object):
+
+    def __init__(self, bpm=120.0, beats_per_bar=4, now=time.monotonic):
+        """Create a clock at bpm, where beat 0 is at show time 0.
+
+        now: the clock taps are timed on, the frame clock's.
+
+        """
+        self.beats_per_bar = beats_per_bar
+        self.follow = None  # a midi_input.MidiClock to take the beat from
+        self._now = now
+        self._offset = 0.0  # show time minus now(), as of the last at()
+        self._state = (0.0, 0.0, float(bpm))  # (show time, beats then, bpm)
+        self._taps = []
+
+    @property
+    def bpm(self):
+        return self._state[2]
+
+    def beats_at(self, t):
+        """Return the beats at show time t."""
+        seconds, beats, bpm = self._state
+        return beats + (t - seconds) * bpm / 60
+
+    def at(self, t):
+        """Return the Time for show time t, in seconds.  Call once a frame."""
+        self._offset = t - self._now()
+        follow = self.follow
+        if follow is not None and follow.running and follow.bpm:
+            # carry on smoothly from the MIDI clock's beat if it stops
+            self._state = (t, follow.beats(), follow.bpm)
+        seconds, beats, bpm = self._state
+        return Time(t, beats + (t - seconds) * bpm / 60, bpm, self.beats_per_bar)
+
+    def _show_time(self):
+        return self._now() + self._offset
+
+    def set_bpm(self, bpm):
+        """Change the tempo from now on, without moving the current beat."""
+        t = self._show_time()
+        self._state = (t, self.beats_at(t), float(bpm))
+
+    def tap(self):
+        """Mark a beat now.  Taps a steady beat apart set the tempo to theirs."""
+        t = self._show_time()
+        taps = self._taps
+        if taps and not 0 < t - taps[-1] <= MAX_TAP_GAP:
+            # a long pause, or a tap at the same time as the last, as from
+            # two in one bundle, starts a new run
+            del taps[:]
+        taps.append(t)
+        del taps[:-MAX_TAPS]
+        bpm = self.bpm
+        if len(taps) >= 2:
+            bpm = 60 * (len(taps) - 1) / (taps[-1] - taps[0])
+        # the tap is on the beat: the nearest whole beat is now
+        self._state = (t, float(round(self.beats_at(t))), bpm)
+
+    def nudge(self, beats):
+        """Move the beat along by beats, which may be negative."""
+        t = self._show_time()
+        self._state = (t, self.beats_at(t) + beats, self.bpm)
+
+    def reset(self):
+        """Make now the downbeat of the nearest bar."""
+        t = self._show_time()
+        bar = round(self.beats_at(t) / self.beats_per_bar)
+        self._state = (t, float(bar * self.beats_per_bar), self.bpm)
+
+    def map_osc(self, dispatcher, prefix='/tempo'):
+        """Map the OSC addresses in the module docstring onto dispatcher."""
+        def pressed(action):
+            def handler(address, *args):
+                if not args or args[0]:
+                    action()
+            return handler
+
+        def on_bpm(address, bpm=None, *args):
+            if bpm and bpm > 0:
+                self.set_bpm(bpm)
+
+        def on_nudge(address, beats=0.0, *args):
+            self.nudge(beats)
+
+        dispatcher.map(prefix + '/tap', pressed(self.tap))
+        dispatcher.map(prefix + '/reset', pressed(self.reset))
+        dispatcher.map(prefix + '/bpm', on_bpm)
+        dispatcher.map(prefix + '/nudge', on_nudge)
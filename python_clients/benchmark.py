@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""Time the renderers on every layout, and save the results for comparison.
+
+For each renderer and each layout this measures, per frame:
+
+    render   the time to compute the colors
+    pack     the time to turn those colors into OPC message bytes
+    alloc    the peak memory allocated during one render, from tracemalloc
+
+The renderers are every pattern registered in render_routines, the
+per-pixel raver_plaid.render_pixels and spiral_dj_control.render_pixels,
+and conway.tick.  The layouts are every file in layouts/ plus synthetic
+point clouds of 50,000 pixels, bigger than any layout we ship.
+
+    python_clients/benchmark.py --output before.json
+    ... change something ...
+    python_clients/benchmark.py --output after.json --compare before.json
+
+Renderers which can't be imported here, for want of a module, are
+reported and skipped.  Each case runs for about --seconds of wall time,
+and at least --min-frames frames, so the per-pixel renderers don't take
+forever on the big layouts.
+
+"""
+
+from __future__ import division
+import glob
+import importlib
+import optparse
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+import tracemalloc
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import numpy as np
+
+import beat_clock
+import layout_cache
+import opc
+import render_routines
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAYOUT_DIR = os.path.join(HERE, '..', 'layouts')
+FRAME_DT = 1 / 24
+SYNTHETIC_PIXELS = 50000
+
+
+#-------------------------------------------------------------------------------
+# layouts
+
+def synthetic_layouts(n_pixels=SYNTHETIC_PIXELS):
+    """Return {name: coords} for point clouds bigger than any layout file."""
+    rng = np.random.RandomState(0)
+    cube = rng.uniform(-1, 1, (n_pixels, 3))
+    sphere = rng.normal(size=(n_pixels, 3))
+    sphere /= np.sqrt((sphere ** 2).sum(axis=1))[:, np.newaxis]
+    return {
+        'synthetic_cube_%dk' % (n_pixels // 1000): cube,
+        'synthetic_sphere_%dk' % (n_pixels // 1000): sphere,
+    }
+
+
+def load_layouts(pattern, synthetic=True):
+    """Return a list of (name, coords) for the layout files matching pattern,
+    smallest first, followed by the synthetic clouds."""
+    layouts = []
+    for path in sorted(glob.glob(os.path.join(LAYOUT_DIR, pattern))):
+        if not path.endswith('.json'):
+            continue
+        coords = layout_cache.load_layout(path).astype(float)
+        if len(coords):
+            layouts.append((os.path.basename(path), coords))
+    layouts.sort(key=lambda item: len(item[1]))
+    if synthetic:
+        layouts.extend(sorted(synthetic_layouts().items()))
+    return layouts
+
+
+#-------------------------------------------------------------------------------
+# renderers
+#
+# Each renderer is a function taking a layout and returning a render(t)
+# function for it, or raising ImportError if it can't run here.
+
+def pattern_renderer(name):
+    def setup(coords):
+        pattern = render_routines.get_pattern(name)()
+        pattern.setup(coords)
+        beats = beat_clock.BeatClock()
+        return lambda t: pattern.render(beats.at(t))
+    return setup
+
+
+def raver_plaid_renderer(coords):
+    raver_plaid = importlib.import_module('raver_plaid')
+    n_pixels = len(coords)
+    return lambda t: raver_plaid.render_pixels(n_pixels, t)
+
+
+def spiral_dj_renderer(coords):
+    spiral_dj_control = importlib.import_module('spiral_dj_control')
+    n_pixels = len(coords)
+    inputs = spiral_dj_control.COLOR_INPUTS + spiral_dj_control.CONTROL_INPUTS
+    controls = spiral_dj_control.default_controls()
+    return lambda t: spiral_dj_control.render_pixels(n_pixels, t, inputs, controls)
+
+
+def conway_tick_renderer(coords):
+    from render_routines import conway
+    random.seed(0)
+    state = {'board': conway.rand_board()}
+
+    def render(t):
+        state['board'] = conway.tick(state['board'])
+        return conway.pixelify_board(state['board'])
+    return render
+
+
+def renderers():
+    """Return a list of (name, setup, uses_layout).
+
+    uses_layout is False for renderers which always draw the same number of
+    pixels, and so are only run once.
+
+    """
+    items = [('pattern:%s' % name, pattern_renderer(name), True)
+             for name in sorted(render_routines.PATTERNS)]
+    items.append(('raver_plaid.render_pixels', raver_plaid_renderer, True))
+    items.append(('spiral_dj_control.render_pixels', spiral_dj_renderer, True))
+    items.append(('conway.tick', conway_tick_renderer, False))
+    return items
+
+
+#-------------------------------------------------------------------------------
+# measuring
+
+def pack(pixels, buffer):
+    """Pack a frame into OPC bytes the way opc.Client would."""
+    if isinstance(pixels, np.ndarray):
+        return buffer.pack_body(pixels)
+    # a list of tuples: one OPC message per 65535 bytes
+    per_message = 0xffff // 3
+    n_bytes = 0
+    for start in range(0, len(pixels), per_message):
+        n_bytes += len(opc._pack(pixels[start:start + per_message], 0, buffer)) - 4
+    return n_bytes
+
+
+def _stats(samples):
+    samples = np.array(samples) * 1e3
+    return {
+        'mean_ms': float(samples.mean()),
+        'min_ms': float(samples.min()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+    }
+
+
+def measure(render, seconds, min_frames, max_frames):
+    """Render and pack frames for about seconds, then measure allocations.
+
+    Returns a dict of results.
+
+    """
+    buffer = opc._MessageBuffer()
+    render_times, pack_times = [], []
+
+    # one untimed frame to warm up caches and allocate reused buffers
+    pack(render(0.0), buffer)
+
+    started = time.perf_counter()
+    frame = 1
+    while (frame <= min_frames or time.perf_counter() - started < seconds) and frame <= max_frames:
+        t = frame * FRAME_DT
+        t0 = time.perf_counter()
+        pixels = render(t)
+        t1 = time.perf_counter()
+        n_bytes = pack(pixels, buffer)
+        t2 = time.perf_counter()
+        render_times.append(t1 - t0)
+        pack_times.append(t2 - t1)
+        frame += 1
+
+    # tracemalloc slows everything down, so allocations are measured apart
+    n_alloc = min(5, len(render_times))
+    peaks = []
+    tracemalloc.start()
+    try:
+        for ii in range(n_alloc):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            render((frame + ii) * FRAME_DT)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'frames': len(render_times),
+        'n_pixels': n_bytes // 3,
+        'render': _stats(render_times),
+        'pack': _stats(pack_times),
+        'alloc_peak_kb': max(peaks) / 1024,
+    }
+
+
+def run(layouts, only=None, seconds=0.5, min_frames=3, max_frames=1000, report=print):
+    """Benchmark every renderer whose name matches the regex only on every layout.
+
+    Returns a list of result dicts.
+
+    """
+    results = []
+    for name, setup, uses_layout in renderers():
+        if only and not re.search(only, name):
+            continue
+        for layout_name, coords in (layouts if uses_layout else [('board_25x25', None)]):
+            np.random.seed(0)
+            try:
+                render = setup(coords)
+            except ImportError as e:
+                report('%-34s skipped: %s' % (name, e))
+                break
+            result = measure(render, seconds, min_frames, max_frames)
+            result.update(renderer=name, layout=layout_name)
+            results.append(result)
+            report(format_result(result))
+    return results
+
+
+#-------------------------------------------------------------------------------
+# reporting
+
+def format_result(result, baseline=None):
+    line = ('%-34s %-28s %6d px  render %9.3f ms  pack %8.3f ms  alloc %9.1f kB'
+            % (result['renderer'], result['layout'], result['n_pixels'],
+               result['render']['mean_ms'], result['pack']['mean_ms'],
+               result['alloc_peak_kb']))
+    if baseline:
+        line += '  median render x%.2f' % (result['render']['p50_ms'] / baseline['render']['p50_ms'])
+    return line
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Print each result against the same case in a saved run.
+
+    Returns the number of cases whose render time grew by more than threshold.
+
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    old = dict(((r['renderer'], r['layout']), r) for r in baseline['results'])
+
+    print()
+    print('compared with %s (%s)' % (baseline_path, baseline.get('revision')))
+    regressions = 0
+    for result in results:
+        before = old.get((result['renderer'], result['layout']))
+        if before is None:
+            continue
+        print(format_result(result, before))
+        if result['render']['p50_ms'] > before['render']['p50_ms'] * (1 + threshold):
+            regressions += 1
+    return regressions
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-o', '--output', dest='output',
+                        action='store', type='string',
+                        help='json file to save the results to')
+    parser.add_option('-c', '--compare', dest='compare',
+                        action='store', type='string',
+                        help='json file from an earlier run to compare against')
+    parser.add_option('--threshold', dest='threshold', default=0.2,
+                        action='store', type='float',
+                        help='with --compare, exit with status 1 if any median render '
+                             'time grew by more than this fraction (default 0.2)')
+    parser.add_option('-r', '--renderers', dest='only',
+                        action='store', type='string',
+                        help='only run renderers whose name matches this regex')
+    parser.add_option('-l', '--layouts', dest='layouts', default='*.json',
+                        action='store', type='string',
+                        help='glob of layout files in layouts/ (default *.json)')
+    parser.add_option('--no-synthetic', dest='synthetic', default=True,
+                        action='store_false',
+                        help="don't run the synthetic 50k pixel layouts")
+    parser.add_option('-s', '--seconds', dest='seconds', default=0.5,
+                        action='store', type='float',
+                        help='seconds to spend on each case (default 0.5)')
+    parser.add_option('--min-frames', dest='min_frames', default=3,
+                        action='store', type='int',
+                        help='fewest frames to render for each case (default 3)')
+    options, args = parser.parse_args()
+
+    layouts = load_layouts(options.layouts, synthetic=options.synthetic)
+    results = run(layouts, only=options.only, seconds=options.seconds,
+                  min_frames=options.min_frames)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({
+                'revision': git_revision(),
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=1, sort_keys=True)
+        print('    saved %d results to %s' % (len(results), options.output))
+
+    if options.compare:
+        regressions = compare(results, options.compare, options.threshold)
+        if regressions:
+            print('    %d renderers got more than %d%% slower'
+                  % (regressions, options.threshold * 100))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
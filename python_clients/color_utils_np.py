@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""Numpy versions of the helpers in color_utils, operating on whole frames.
+
+Each function takes arrays where color_utils takes scalars or (r, g, b)
+tuples, and returns the same values within float tolerance.  Colors are
+arrays of shape (N, 3) and other values arrays of shape (N,); the remaining
+arguments may be scalars or arrays that broadcast against the first one.
+
+Every function accepts an optional out array which receives the result,
+so a pattern can compute a frame into preallocated buffers without
+allocating.  out may be one of the inputs.
+
+"""
+
+from __future__ import division
+import numpy as np
+
+def _float_out(out, *args):
+    """Return out, or a new float array the shape args broadcast to.  Scalars
+    get a 0-d array, since a ufunc can't write into a numpy scalar."""
+    if out is None:
+        out = np.empty(np.broadcast(*args).shape)
+    return out
+
+def remap(x, oldmin, oldmax, newmin, newmax, out=None):
+    """Remap the array x from the range oldmin-oldmax to the range newmin-newmax
+
+    Does not clamp values that exceed min or max.
+
+    """
+    out = np.subtract(x, oldmin, out=out, dtype=float)
+    out *= (newmax-newmin) / (oldmax-oldmin)
+    out += newmin
+    return out
+
+def clamp(x, minn, maxx, out=None):
+    """Restrict the array x to the range minn-maxx."""
+    return np.clip(x, minn, maxx, out=out)
+
+def cos(x, offset=0, period=1, minn=0, maxx=1, out=None):
+    """A cosine curve scaled to fit in a 0-1 range and 0-1 domain by default.
+
+    offset: how much to slide the curve across the domain (should be 0-1)
+    period: the length of one wave
+    minn, maxx: the output range
+
+    """
+    out = np.divide(x, period, out=_float_out(out, x, period))
+    out -= offset
+    out *= np.pi * 2
+    np.cos(out, out=out)
+    out *= (maxx-minn) / 2
+    out += (maxx-minn) / 2 + minn
+    return out[()] if out.ndim == 0 else out
+
+def contrast(color, center, mult, out=None):
+    """Expand the color values by a factor of mult around the pivot value of center.
+
+    color: an (N, 3) array
+    center: a float -- the fixed point
+    mult: a float -- expand or contract the values around the center point
+
+    """
+    out = np.subtract(color, center, out=out, dtype=float)
+    out *= mult
+    out += center
+    return out
+
+def clip_black_by_luminance(color, threshold, out=None):
+    """Replace each color whose luminance is less than threshold with black.
+
+    color: an (N, 3) array
+    threshold: a float
+
+    """
+    dark = color.sum(axis=-1) < threshold*3
+    if out is None:
+        out = np.array(color, dtype=float)
+    elif out is not color:
+        out[...] = color
+    out[dark] = 0
+    return out
+
+def clip_black_by_channels(color, threshold, out=None):
+    """Replace any individual r, g, or b value less than threshold with 0.
+
+    color: an (N, 3) array
+    threshold: a float
+
+    """
+    if out is None:
+        out = np.array(color, dtype=float)
+    elif out is not color:
+        out[...] = color
+    out[out < threshold] = 0
+    return out
+
+def mod_dist(a, b, n, out=None):
+    """Return the distance between a and b, modulo n.
+
+    The result is always non-negative.
+
+    """
+    out = np.subtract(a, b, out=out, dtype=float)
+    np.mod(out, n, out=out)
+    return np.minimum(out, n - out, out=out)
+
+def gamma(color, gamma, out=None):
+    """Apply a gamma curve to the colors.  The color values should be in the range 0-1."""
+    out = np.maximum(color, 0, out=_float_out(out, color))
+    np.power(out, gamma, out=out)
+    return out[()] if out.ndim == 0 else out
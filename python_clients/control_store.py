@@ -0,0 +1,194 @@
+"""Latest-value control store in shared memory, for OSC receivers and renderers.
+
+Queueing every OSC message for the renderer means a fader sweep of
+hundreds of messages is worked through one per frame, seconds behind the
+hand on the fader.  The renderer only ever wants the latest value of each
+control, so the store keeps exactly that: one slot of floats per
+registered address in a block of shared memory.  The OSC receiver, in
+any process, overwrites a slot as each message arrives, and the renderer
+copies out every slot at the start of a frame:
+
+    store = control_store.ControlStore({'/1/red': (-0.7, -1.7), '/LeftBright': 1.0})
+
+    # in the OSC receiver
+    store.set('/1/red', x, y)
+
+    # in the render loop, once a frame
+    controls = store.snapshot_dict()
+    speed_r, freq_r = controls['/1/red']
+
+There is no backlog, nothing is pickled, and a snapshot costs the same
+however many messages arrived since the last one.
+
+Snapshots are consistent, never half of one write and half of another,
+by way of a sequence lock: writers make the sequence counter odd while
+they write and even again after, and a reader which sees the counter
+change or odd while it copies simply copies again.  Writers take a lock
+between themselves; readers never wait for anyone.
+
+A store can be passed to a multiprocessing.Process, or inherited across
+a fork, and both sides share the same memory.
+
+"""
+
+from __future__ import division
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_HEADER = 2  # int64s before the slot counters: sequence, spare
+
+
+def _as_values(values):
+    """Convert an OSC message's arguments to floats, before any write begins,
+    so a bad argument raises with the sequence still even."""
+    values = np.asarray(values, dtype=float)
+    if values.ndim != 1:
+        raise ValueError('control values must be numbers, not %r' % (values.tolist(),))
+    return values
+
+
+class ControlStore(object):
+
+    def __init__(self, defaults):
+        """Create a store with one slot per address in defaults.
+
+        defaults: {address: value or tuple of values}.  Each slot holds as
+            many floats as its default value.
+
+        """
+        self.addresses = list(defaults)
+        widths = [len(v) if isinstance(v, (tuple, list)) else 1 for v in defaults.values()]
+        n_values = sum(widths)
+        size = 8 * (_HEADER + len(widths) + n_values)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+        self._lock = multiprocessing.Lock()
+        self._layout = (widths, n_values)
+        self._attach()
+
+        self._values[:] = np.concatenate(
+            [np.atleast_1d(np.asarray(v, dtype=float)) for v in defaults.values()])
+
+    def _attach(self):
+        widths, n_values = self._layout
+        n_slots = len(widths)
+        words = np.ndarray(_HEADER + n_slots, dtype=np.int64, buffer=self._shm.buf)
+        self._seq = words[0:1]
+        self._counters = words[_HEADER:]
+        self._values = np.ndarray(n_values, dtype=np.float64, buffer=self._shm.buf,
+                                  offset=8 * (_HEADER + n_slots))
+
+        # address -> (slot index, start, stop) in _values
+        self._slots = {}
+        start = 0
+        for index, (address, width) in enumerate(zip(self.addresses, widths)):
+            self._slots[address] = (index, start, start + width)
+            start += width
+        self._scratch = np.empty(n_values)
+
+    def __getstate__(self):
+        return {'name': self._shm.name, 'addresses': self.addresses,
+                'layout': self._layout, 'lock': self._lock}
+
+    def __setstate__(self, state):
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._owner = False
+        self.addresses = state['addresses']
+        self._layout = state['layout']
+        self._lock = state['lock']
+        self._attach()
+
+    def __contains__(self, address):
+        return address in self._slots
+
+    @property
+    def sequence(self):
+        """Twice the number of changes so far.  Unchanged means nothing was written."""
+        return int(self._seq[0])
+
+    def set(self, address, *values):
+        """Write the latest values for address.  Returns False for an unknown address.
+
+        Extra values are ignored and missing ones are left as they were, so
+        any OSC message for the address can be stored as it is.
+
+        """
+        slot = self._slots.get(address)
+        if slot is None:
+            return False
+        index, start, stop = slot
+        values = _as_values(values[:stop - start])
+        with self._lock:
+            self._seq += 1                  # odd: write in progress
+            self._values[start:start + len(values)] = values
+            self._counters[index] += 1
+            self._seq += 1                  # even: done
+        return True
+
+    def set_many(self, items):
+        """Write several (address, values) pairs as one change.
+
+        A snapshot sees all of them or none, so the messages of one OSC
+        bundle land on the same frame.  Unknown addresses are skipped.
+        Returns the number written.
+
+        """
+        writes = []
+        for address, values in items:
+            slot = self._slots.get(address)
+            if slot is None:
+                continue
+            index, start, stop = slot
+            writes.append((index, start, _as_values(values[:stop - start])))
+        with self._lock:
+            self._seq += 1
+            for index, start, values in writes:
+                self._values[start:start + len(values)] = values
+                self._counters[index] += 1
+            self._seq += 1
+        return len(writes)
+
+    def snapshot(self, out=None):
+        """Copy every slot's values, consistently, into out and return it.
+
+        out: a float array of the store's total width, by default one
+            reused by every call.
+
+        """
+        if out is None:
+            out = self._scratch
+        while True:
+            before = self._seq[0]
+            if before & 1:
+                continue  # a write is in progress
+            np.copyto(out, self._values)
+            if self._seq[0] == before:
+                return out
+
+    def snapshot_dict(self):
+        """Return {address: value} from a consistent snapshot.
+
+        Single-value slots give a float, wider ones a tuple of floats.
+
+        """
+        values = self.snapshot().tolist()
+        controls = {}
+        for address, (index, start, stop) in self._slots.items():
+            if stop - start == 1:
+                controls[address] = values[start]
+            else:
+                controls[address] = tuple(values[start:stop])
+        return controls
+
+    def changes(self, address):
+        """Return how many times address has been written."""
+        return int(self._counters[self._slots[address][0]])
+
+    def close(self):
+        """Detach from the shared memory, and free it if this store created it."""
+        self._seq = self._counters = self._values = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
@@ -0,0 +1,316 @@
+"""E1.31 (sACN) and Art-Net output, with the same put_pixels() as opc.Client.
+
+DMX carries 512 channels a universe, so a frame of N pixels goes out as
+ceil(N / 170) universes of up to 170 rgb pixels, numbered up from the
+first universe:
+
+    client = dmx_output.E131Client(universe=1)                  # multicast
+    client = dmx_output.E131Client('10.0.0.20', universe=1)     # unicast
+    client = dmx_output.ArtNetClient('2.0.0.10', universe=0)    # or broadcast with no host
+    client.put_pixels(pixels)
+
+or from a URL, which is what run_pattern.py --server accepts:
+
+    sacn:///1                 E1.31 multicast from universe 1
+    sacn://10.0.0.20/1?sync=64000
+    artnet://2.0.0.10/0       Art-Net unicast from universe 0
+    artnet:///0               Art-Net broadcast
+
+Every universe's packet lives in one preallocated buffer, headers and
+all.  Only the fields which change are patched in place: each frame's
+pixels are clipped into the data slots of every universe at once with
+numpy, and the sequence number is written into every header in one
+assignment, so a frame costs two array copies and one sendto per
+universe.
+
+Each frame's packets carry a sequence number.  For the universes of a
+frame to latch together, a sync packet follows them: an E1.31
+Synchronization packet on sync_universe, which the data packets name so
+receivers hold them until it arrives, or an ArtSync.
+
+"""
+
+from __future__ import division
+import socket
+import struct
+import uuid
+try:
+    from urllib.parse import parse_qs, urlsplit
+except ImportError:
+    from urlparse import parse_qs, urlsplit
+
+import numpy as np
+
+import stage_timers
+
+PIXELS_PER_UNIVERSE = 170
+CHANNELS_PER_UNIVERSE = PIXELS_PER_UNIVERSE * 3
+
+E131_PORT = 5568
+ARTNET_PORT = 6454
+SCHEMES = ('sacn', 'e131', 'artnet')
+
+# E1.31 data packet offsets
+_E131_HEADER = 126
+_E131_ROOT_LENGTH = 16
+_E131_FRAMING_LENGTH = 38
+_E131_SYNC_ADDRESS = 109
+_E131_SEQUENCE = 111
+_E131_UNIVERSE = 113
+_E131_DMP_LENGTH = 115
+_E131_VALUE_COUNT = 123
+
+# Art-Net ArtDmx packet offsets
+_ARTNET_HEADER = 18
+_ARTNET_SEQUENCE = 12
+_ARTNET_UNIVERSE = 14  # little-endian port address
+_ARTNET_LENGTH = 16
+
+
+def multicast_address(universe):
+    """The E1.31 multicast group of universe."""
+    return '239.255.%d.%d' % (universe >> 8, universe & 0xff)
+
+
+def _put16(column_pair, values):
+    """Write big-endian 16 bit values into an (n, 2) byte column pair."""
+    column_pair[:, 0] = values >> 8
+    column_pair[:, 1] = values & 0xff
+
+
+class _UniverseClient(object):
+    """Packs frames into per-universe packets and sends them over UDP.
+
+    Subclasses set _HEADER, _SEQUENCE and the packet layout in _template(),
+    _patch_lengths() and _sync_packet().
+
+    """
+
+    _HEADER = 0
+    _SEQUENCE = 0
+
+    def __init__(self, host, universe, port, timers=None):
+        self.host = host
+        self.universe = universe
+        self.port = port
+        self.timers = timers or stage_timers.StageTimers(enabled=False)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.frames_sent = 0
+        self.frames_dropped = 0  # kept for the same interface as opc.Client
+        self.sequence = 0
+        self._n_pixels = None
+
+    def _allocate(self, n_pixels):
+        """Build the packets for frames of n_pixels."""
+        n_universes = max(1, -(-n_pixels // PIXELS_PER_UNIVERSE))
+        stride = self._HEADER + CHANNELS_PER_UNIVERSE
+        self._buffer = bytearray(n_universes * stride)
+        self._packets = np.frombuffer(self._buffer, dtype=np.uint8).reshape(n_universes, stride)
+        self._slots = self._packets[:, self._HEADER:]
+        self._scratch = np.zeros(n_universes * CHANNELS_PER_UNIVERSE, dtype=np.uint8)
+
+        universes = self.universe + np.arange(n_universes)
+        channels = np.full(n_universes, CHANNELS_PER_UNIVERSE)
+        channels[-1] = n_pixels * 3 - (n_universes - 1) * CHANNELS_PER_UNIVERSE
+        channels = self._round_channels(channels)
+        self._packets[:] = np.frombuffer(self._template(), dtype=np.uint8)
+        self._patch_lengths(universes, channels)
+
+        view = memoryview(self._buffer)
+        self._views = [view[u * stride:u * stride + self._HEADER + c]
+                       for u, c in enumerate(channels.tolist())]
+        self._addresses = [self._address(u) for u in universes.tolist()]
+        self._n_pixels = n_pixels
+
+    def _round_channels(self, channels):
+        return channels
+
+    def can_connect(self):
+        """UDP has no connection; True if the socket is open."""
+        return self.sock is not None
+
+    def put_pixels(self, pixels, channel=0):
+        """Send pixels, an (N, 3) array or a list of (r, g, b), as one frame.
+
+        channel is accepted for the sake of opc.Client's interface; the
+        universes are set by the client's first universe.  Returns True if
+        every packet was handed to the network.  An empty frame sends
+        nothing.
+
+        """
+        start = self.timers.now()
+        if not isinstance(pixels, np.ndarray):
+            pixels = np.asarray(pixels, dtype=float)
+        n_pixels = len(pixels)
+        if n_pixels == 0:
+            return True  # no universe to send; an empty ArtDmx isn't even valid
+        if n_pixels != self._n_pixels:
+            self._allocate(n_pixels)
+
+        flat = self._scratch[:n_pixels * 3].reshape(pixels.shape)
+        if pixels.dtype == np.uint8:
+            np.copyto(flat, pixels)
+        else:
+            np.clip(pixels, 0, 255, out=flat, casting='unsafe')
+        np.copyto(self._slots, self._scratch.reshape(self._slots.shape))
+        self.sequence = self._next_sequence(self.sequence)
+        self._packets[:, self._SEQUENCE] = self.sequence
+        start = self.timers.lap('pack', start)
+
+        try:
+            sendto = self.sock.sendto
+            for view, address in zip(self._views, self._addresses):
+                sendto(view, address)
+            sync = self._sync_packet()
+            if sync is not None:
+                sendto(*sync)
+        except socket.error:
+            self.frames_dropped += 1
+            return False
+        self.frames_sent += 1
+        self.timers.lap('send', start)
+        return True
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        self.sock = None
+
+
+class E131Client(_UniverseClient):
+
+    _HEADER = _E131_HEADER
+    _SEQUENCE = _E131_SEQUENCE
+
+    def __init__(self, host=None, universe=1, port=E131_PORT, sync_universe=None,
+                 priority=100, source_name='openpixelcontrol', ttl=8, interface=None,
+                 timers=None):
+        """Create an E1.31 sender.
+
+        host: the receiver's ip, or None to multicast each universe to its
+            own group.
+        universe: the first universe, 1 to 63999.
+        sync_universe: if set, data packets wait for a Synchronization
+            packet sent on this universe after each frame.
+        ttl, interface: the multicast hop limit, and the ip of the network
+            interface to multicast from.
+
+        """
+        _UniverseClient.__init__(self, host, universe, port, timers)
+        self.sync_universe = sync_universe
+        self.priority = priority
+        self.source_name = source_name
+        self.cid = uuid.uuid4().bytes
+        if host is None:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+            if interface:
+                self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                     socket.inet_aton(interface))
+
+        if sync_universe is not None:
+            self._sync = bytearray(49)
+            struct.pack_into('>HH12sHI16sHIBHH', self._sync, 0,
+                             0x0010, 0, b'ASC-E1.17\x00\x00\x00', 0x7000 | 33, 0x00000008,
+                             self.cid, 0x7000 | 11, 0x00000001, 0, sync_universe, 0)
+            self._sync_address = self._address(sync_universe)
+
+    def _address(self, universe):
+        return (self.host or multicast_address(universe), self.port)
+
+    def _template(self):
+        header = bytearray(_E131_HEADER)
+        struct.pack_into('>HH12s', header, 0, 0x0010, 0, b'ASC-E1.17\x00\x00\x00')
+        struct.pack_into('>I16s', header, 18, 0x00000004, self.cid)
+        struct.pack_into('>I64sBHBBH', header, 40, 0x00000002,
+                         self.source_name.encode('utf-8')[:63], self.priority,
+                         self.sync_universe or 0, 0, 0, 0)
+        struct.pack_into('>BBHHHB', header, 117, 0x02, 0xa1, 0, 1, 0, 0)
+        return bytes(header) + bytes(CHANNELS_PER_UNIVERSE)
+
+    def _patch_lengths(self, universes, channels):
+        packets = self._packets
+        length = _E131_HEADER + channels
+        _put16(packets[:, _E131_UNIVERSE:_E131_UNIVERSE + 2], universes)
+        _put16(packets[:, _E131_ROOT_LENGTH:_E131_ROOT_LENGTH + 2],
+               0x7000 | (length - _E131_ROOT_LENGTH))
+        _put16(packets[:, _E131_FRAMING_LENGTH:_E131_FRAMING_LENGTH + 2],
+               0x7000 | (length - _E131_FRAMING_LENGTH))
+        _put16(packets[:, _E131_DMP_LENGTH:_E131_DMP_LENGTH + 2],
+               0x7000 | (length - _E131_DMP_LENGTH))
+        _put16(packets[:, _E131_VALUE_COUNT:_E131_VALUE_COUNT + 2], channels + 1)
+
+    def _next_sequence(self, sequence):
+        return (sequence + 1) & 0xff
+
+    def _sync_packet(self):
+        if self.sync_universe is None:
+            return None
+        self._sync[44] = self.sequence
+        return self._sync, self._sync_address
+
+
+class ArtNetClient(_UniverseClient):
+
+    _HEADER = _ARTNET_HEADER
+    _SEQUENCE = _ARTNET_SEQUENCE
+
+    def __init__(self, host=None, universe=0, port=ARTNET_PORT, sync=True, timers=None):
+        """Create an Art-Net sender.
+
+        host: the node's ip, or None to broadcast.
+        universe: the first 15 bit port address.
+        sync: send an ArtSync after each frame of more than one universe.
+
+        """
+        _UniverseClient.__init__(self, host, universe, port, timers)
+        self.sync = sync
+        if host is None:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self._sync = b'Art-Net\x00' + struct.pack('<H', 0x5200) + b'\x00\x0e\x00\x00'
+
+    def _address(self, universe):
+        return (self.host or '255.255.255.255', self.port)
+
+    def _template(self):
+        header = b'Art-Net\x00' + struct.pack('<H', 0x5000) + b'\x00\x0e' + bytes(6)
+        return header + bytes(CHANNELS_PER_UNIVERSE)
+
+    def _round_channels(self, channels):
+        return channels + (channels & 1)  # ArtDmx lengths are even
+
+    def _patch_lengths(self, universes, channels):
+        packets = self._packets
+        packets[:, _ARTNET_UNIVERSE] = universes & 0xff
+        packets[:, _ARTNET_UNIVERSE + 1] = (universes >> 8) & 0x7f
+        _put16(packets[:, _ARTNET_LENGTH:_ARTNET_LENGTH + 2], channels)
+
+    def _next_sequence(self, sequence):
+        return sequence % 255 + 1  # 1 to 255; 0 turns sequencing off
+
+    def _sync_packet(self):
+        if not self.sync or len(self._views) < 2:
+            return None
+        return self._sync, self._addresses[0]
+
+
+def client_from_url(url, timers=None):
+    """Return an E131Client or ArtNetClient for a URL like those in the
+    module docstring."""
+    parts = urlsplit(url)
+    if parts.scheme not in SCHEMES:
+        raise ValueError('DMX output URL must start with %s, not %r'
+                         % (' or '.join('%s://' % s for s in SCHEMES), url))
+    host = parts.hostname or None
+    query = dict((k, v[-1]) for k, v in parse_qs(parts.query).items())
+    try:
+        path = parts.path.strip('/')
+        if parts.scheme == 'artnet':
+            universe = int(path) if path else 0
+            return ArtNetClient(host, universe, parts.port or ARTNET_PORT,
+                                sync=query.get('sync', '1') != '0', timers=timers)
+        universe = int(path) if path else 1
+        sync = int(query['sync']) if 'sync' in query else None
+        return E131Client(host, universe, parts.port or E131_PORT, sync_universe=sync,
+                          interface=query.get('interface'), timers=timers)
+    except ValueError:
+        raise ValueError('bad DMX output URL %r' % url)
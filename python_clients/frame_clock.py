@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+"""A frame clock which paces render loops on absolute deadlines.
+
+Sleeping for 1/fps after each frame always runs slower than fps, by however
+long the frame took to render and send.  FrameClock instead schedules frame
+k at start + k/fps on the monotonic clock and sleeps only for the time left
+until that deadline.  When the renderer falls behind by a whole frame or
+more, the missed deadlines are dropped rather than rendered late in a burst.
+
+    clock = frame_clock.FrameClock(fps=30)
+    while True:
+        t = clock.tick()
+        client.put_pixels(pattern.render(t), channel=0)
+
+tick() returns the time to render the frame for, in one of two modes which
+a clock keeps for its whole life:
+
+    FIXED: simulation time, exactly frame_index / fps.  Animation is
+           perfectly even, and dropped frames still advance time.
+    WALL:  monotonic seconds since the first tick, as measured when the
+           frame starts.  Follows real time, including its jitter.
+
+"""
+
+from __future__ import division
+import asyncio
+import time
+
+FIXED = 'fixed'
+WALL = 'wall'
+MODES = (FIXED, WALL)
+
+
+class FrameClock(object):
+
+    def __init__(self, fps, mode=FIXED, now=time.monotonic, sleep=time.sleep):
+        """Create a clock ticking fps times per second.
+
+        mode: FIXED or WALL, see the module docstring.
+        now, sleep: the clock and sleep functions, replaceable for testing.
+
+        """
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s, not %r' % (', '.join(MODES), mode))
+        self.fps = fps
+        self.dt = 1 / fps
+        self.mode = mode
+        self._now = now
+        self._sleep = sleep
+        self.reset()
+
+    def reset(self):
+        """Restart the clock at time 0 on the next tick and clear the stats."""
+        self.start = None
+        self.frame = 0      # index of the next deadline
+        self.rendered = 0   # frames returned by tick()
+        self.dropped = 0    # deadlines skipped because we were behind
+        self.jitter_last = 0.0
+        self.jitter_max = 0.0
+        self._jitter_total = 0.0
+
+    def tick(self):
+        """Wait for the next frame deadline and return the time to render for."""
+        now, deadline = self._next_deadline()
+        if now < deadline:
+            self._sleep(deadline - now)
+            now = self._now()
+        return self._start_frame(now, deadline)
+
+    async def tick_async(self):
+        """Like tick(), but waits with asyncio.sleep so an event loop keeps running."""
+        now, deadline = self._next_deadline()
+        if now < deadline:
+            await asyncio.sleep(deadline - now)
+            now = self._now()
+        return self._start_frame(now, deadline)
+
+    @property
+    def next_deadline(self):
+        """When the next frame is due, and so the current one ends, on the now clock."""
+        return self.start + self.frame * self.dt
+
+    def _next_deadline(self):
+        """Return (now, deadline of the next frame), skipping any we are too late for."""
+        now = self._now()
+        if self.start is None:
+            self.start = now
+
+        deadline = self.start + self.frame * self.dt
+        if now >= deadline:
+            behind = int((now - deadline) / self.dt)
+            if behind:
+                self.dropped += behind
+                self.frame += behind
+                deadline += behind * self.dt
+        return now, deadline
+
+    def _start_frame(self, now, deadline):
+        jitter = now - deadline
+        self.jitter_last = jitter
+        self.jitter_max = max(self.jitter_max, jitter)
+        self._jitter_total += jitter
+
+        if self.mode == FIXED:
+            t = self.frame * self.dt
+        else:
+            t = now - self.start
+        self.frame += 1
+        self.rendered += 1
+        return t
+
+    def stats(self):
+        """Return a dict of frame counts, achieved fps and jitter in seconds."""
+        elapsed = self.frame * self.dt
+        return {
+            'rendered': self.rendered,
+            'dropped': self.dropped,
+            'fps': self.rendered / elapsed if elapsed else 0.0,
+            'jitter_last': self.jitter_last,
+            'jitter_mean': self._jitter_total / self.rendered if self.rendered else 0.0,
+            'jitter_max': self.jitter_max,
+        }
+
+    def format_stats(self):
+        return ('%(rendered)d frames, %(dropped)d dropped, %(fps).1f fps, '
+                'jitter mean %(jitter_mean).4fs max %(jitter_max).4fs' % self.stats())
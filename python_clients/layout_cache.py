@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+"""Load layout files, caching them as memory-mappable binary arrays.
+
+Parsing a large layout like layouts/spiral_3250_pts.json with json.load
+takes longer than rendering several frames.  load_layout() parses a layout
+once, writes its points to a compact binary file, and memory-maps that
+file on every later call:
+
+    import layout_cache
+    coords = layout_cache.load_layout('layouts/spiral_3250_pts.json')  # (N, 3) float32
+
+The cache lives in a .cache directory next to the layout file.  A cache
+file is used as long as the layout's mtime and size are unchanged; if
+they have changed the layout is hashed, and the cache is only rebuilt
+if the contents really differ.
+
+To build the caches ahead of time, for example before a show:
+
+    python_clients/layout_cache.py layouts/*.json
+
+"""
+
+from __future__ import division
+import hashlib
+import os
+import struct
+import sys
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import numpy as np
+
+MAGIC = b'OPCLAYT1'
+CACHE_DIR = '.cache'
+CACHE_SUFFIX = '.layout'
+ALIGN = 16
+
+_HEADER = struct.Struct('<8sI')  # magic, length of the json metadata
+
+
+def parse_layout(path):
+    """Parse a json layout file into an (N, 3) float32 array of points.
+
+    Items without a 'point' are skipped, as the pattern scripts always have.
+
+    """
+    with open(path) as f:
+        items = json.load(f)
+    points = [item['point'] for item in items if 'point' in item]
+    return np.array(points, dtype=np.float32).reshape(-1, 3)
+
+
+def cache_path(path):
+    """Return the path of the binary cache file for the layout at path."""
+    directory, filename = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIR, filename + CACHE_SUFFIX)
+
+
+def _hash_file(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def _source_key(path):
+    st = os.stat(path)
+    return {'mtime_ns': st.st_mtime_ns, 'size': st.st_size}
+
+
+def read_metadata(cache_file):
+    """Return (metadata dict, data offset) from a cache file, or (None, None)."""
+    try:
+        with open(cache_file, 'rb') as f:
+            magic, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC:
+                return None, None
+            meta = json.loads(f.read(meta_len).decode('utf-8'))
+    except (IOError, OSError, ValueError, struct.error):
+        return None, None
+    offset = _HEADER.size + meta_len
+    return meta, offset + (-offset % ALIGN)
+
+
+def write_cache(cache_file, points, meta):
+    """Write points and meta to cache_file, replacing it atomically."""
+    meta = dict(meta, n_points=len(points), dtype='float32')
+    meta_bytes = json.dumps(meta, sort_keys=True).encode('utf-8')
+    offset = _HEADER.size + len(meta_bytes)
+    padding = b'\0' * (-offset % ALIGN)
+
+    directory = os.path.dirname(cache_file)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp_file = '%s.%d.tmp' % (cache_file, os.getpid())
+    with open(tmp_file, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(meta_bytes)))
+        f.write(meta_bytes)
+        f.write(padding)
+        f.write(np.ascontiguousarray(points, dtype='<f4').tobytes())
+    os.replace(tmp_file, cache_file)
+
+
+def map_cache(cache_file, meta, offset):
+    """Memory-map the points in a cache file as a read-only (N, 3) float32 array."""
+    if meta['n_points'] == 0:
+        return np.zeros((0, 3), dtype=np.float32)
+    return np.memmap(cache_file, dtype='<f4', mode='r', offset=offset,
+                     shape=(meta['n_points'], 3))
+
+
+def compile_layout(path):
+    """Parse the layout at path and (re)write its cache file.
+
+    Returns the points as an (N, 3) float32 array.
+
+    """
+    key = _source_key(path)
+    points = parse_layout(path)
+    write_cache(cache_path(path), points, dict(key, sha1=_hash_file(path)))
+    return points
+
+
+def load_layout(path):
+    """Return the points of the layout at path as an (N, 3) float32 array.
+
+    Uses the binary cache when it is up to date and rebuilds it when it is
+    not, or can't be mapped.  If the cache can't be written, the layout is
+    just parsed.
+
+    """
+    key = _source_key(path)
+    cache_file = cache_path(path)
+    meta, offset = read_metadata(cache_file)
+
+    if meta is not None:
+        try:
+            if all(meta.get(k) == v for k, v in key.items()):
+                return map_cache(cache_file, meta, offset)
+            if meta.get('sha1') == _hash_file(path):
+                # touched but not changed: refresh the key, keep the points
+                points = np.array(map_cache(cache_file, meta, offset))
+                try:
+                    write_cache(cache_file, points, dict(meta, **key))
+                except (IOError, OSError):
+                    pass
+                return points
+        except (IOError, OSError, ValueError):
+            pass  # a truncated or damaged cache file: rebuild it below
+
+    try:
+        return compile_layout(path)
+    except (IOError, OSError):
+        return parse_layout(path)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print('Usage: layout_cache.py layout.json [layout.json ...]')
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        points = compile_layout(path)
+        print('    %s: %d points -> %s' % (path, len(points), cache_path(path)))
+
+
+if __name__ == '__main__':
+    main()
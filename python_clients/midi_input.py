@@ -0,0 +1,481 @@
+#!/usr/bin/env python
+
+"""MIDI input: controllers, notes and clock, mapped onto the OSC controls.
+
+Control changes and notes are turned into the same addresses and values
+as the TouchOSC layout sends, so MIDI faders and pads drive the same
+controls as OSC:
+
+    control_map = midi_input.ControlMap(['cc:1:7=/LeftBright:0:2',   # channel 1, CC 7
+                                         'cc:*:1=/XFader',           # CC 1 on any channel
+                                         'note:10:36=/Strobe'])      # a pad on channel 10
+    midi = midi_input.MidiInput(control_map)
+    midi.start('/dev/snd/midiC1D0')
+
+A CC maps 0..127 onto LO..HI, 0..1 by default; a note sets its velocity
+the same way on note on, and LO on note off.
+
+MIDI clock, 24 ticks per beat, is followed by midi.clock, which fits a
+line through the times of the last couple of beats of ticks for a steady
+tempo, and interpolates between ticks for a smooth beat position:
+
+    midi.clock.bpm           # None until the clock has been running a moment
+    midi.clock.beats()       # beats since the last Start, as a float
+    midi.clock.phase()       # position within the current beat, 0 to 1
+
+Start, Stop, Continue and Song Position Pointer are followed too.
+
+The source is read in a thread of its own, or in python-rtmidi's thread
+for a named port.  It never takes a lock the render loop waits on: mapped
+controls go onto a deque, which the render loop empties once a frame,
+
+    dispatcher.dispatch(midi.drain())      # an osc_dispatch.Dispatcher
+
+and the clock publishes its state as one tuple, replaced whole, so a
+reader always sees a consistent tick count, tick time and tempo.
+
+Sources, for start():
+
+    /dev/snd/midiC1D0   a raw MIDI device, or any file or pipe of MIDI bytes
+    -                   MIDI bytes on stdin
+    song.mid            a Standard MIDI File, played in real time, with a
+                        MIDI clock made from its tempo map
+    port:NAME           the first python-rtmidi input port whose name has NAME in it
+
+so everything can be tested without hardware.  To watch what a source
+sends and what it maps to:
+
+    python_clients/midi_input.py song.mid --map 'note:*:*=/Strobe'
+
+"""
+
+from __future__ import division
+import argparse
+import collections
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+import osc_dispatch
+
+try:
+    import rtmidi
+except ImportError:
+    rtmidi = None
+
+TICKS_PER_BEAT = 24
+
+NOTE_OFF = 0x80
+NOTE_ON = 0x90
+CONTROL_CHANGE = 0xB0
+SONG_POSITION = 0xF2
+CLOCK = 0xF8
+START = 0xFA
+CONTINUE = 0xFB
+STOP = 0xFC
+
+# data bytes after each status byte, by its high nibble or, for system
+# messages, by the whole byte
+_CHANNEL_LENGTHS = {0x80: 2, 0x90: 2, 0xA0: 2, 0xB0: 2, 0xC0: 1, 0xD0: 1, 0xE0: 2}
+_SYSTEM_LENGTHS = {0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0}
+
+
+def _data_length(status):
+    if status < 0xF0:
+        return _CHANNEL_LENGTHS[status & 0xF0]
+    return _SYSTEM_LENGTHS.get(status, 0)
+
+
+class MidiParser(object):
+    """Turns a stream of MIDI bytes into messages, tuples of the status
+    byte and its data bytes.  Running status is followed, real time bytes
+    are passed on wherever they fall, and system exclusive is skipped."""
+
+    def __init__(self):
+        self._status = None  # the running status
+        self._data = []
+        self._sysex = False
+
+    def feed(self, data):
+        """Parse some more bytes and return the messages completed."""
+        messages = []
+        for byte in data:
+            if byte >= 0xF8:
+                messages.append((byte,))
+            elif byte >= 0x80:
+                self._data = []
+                self._sysex = byte == 0xF0
+                if self._sysex or byte == 0xF7:
+                    self._status = None
+                elif _data_length(byte) == 0:
+                    messages.append((byte,))
+                    self._status = None
+                else:
+                    self._status = byte
+            elif self._status is not None:
+                self._data.append(byte)
+                if len(self._data) == _data_length(self._status):
+                    messages.append((self._status,) + tuple(self._data))
+                    self._data = []
+                    if self._status >= 0xF0:
+                        self._status = None  # system messages have no running status
+        return messages
+
+
+class MidiClock(object):
+    """Tempo and beat position from MIDI clock ticks."""
+
+    def __init__(self, window=2 * TICKS_PER_BEAT, now=time.monotonic):
+        """Fit the tempo to the last window ticks, timed on the now clock."""
+        self._now = now
+        self._window = collections.deque(maxlen=window)
+        # (running, ticks since Start, time of the last tick, seconds per tick or None)
+        self.state = (False, 0, 0.0, None)
+
+    def handle(self, message, timestamp):
+        """Follow a clock, Start, Stop, Continue or Song Position message."""
+        running, ticks, tick_time, seconds_per_tick = self.state
+        status = message[0]
+        if status == CLOCK:
+            if not running:
+                return
+            ticks += 1
+            tick_time = timestamp
+            window = self._window
+            window.append((ticks, timestamp))
+            if len(window) >= 3:
+                seconds_per_tick = _slope(window)
+        elif status == START:
+            # the first tick after Start is the downbeat, tick 0
+            running, ticks = True, -1
+            self._window.clear()
+        elif status == CONTINUE:
+            running = True
+            self._window.clear()
+        elif status == STOP:
+            running = False
+        elif status == SONG_POSITION:
+            # in sixteenth notes, 6 ticks each; the next tick is that position
+            ticks = ((message[2] << 7) | message[1]) * 6 - 1
+            self._window.clear()
+        else:
+            return
+        self.state = (running, ticks, tick_time, seconds_per_tick)
+
+    @property
+    def bpm(self):
+        """The tempo in beats per minute, or None until it is known."""
+        seconds_per_tick = self.state[3]
+        if seconds_per_tick is None or seconds_per_tick <= 0:
+            return None
+        return 60 / (seconds_per_tick * TICKS_PER_BEAT)
+
+    @property
+    def running(self):
+        return self.state[0]
+
+    def beats(self, now=None):
+        """Return the beats since Start, interpolated between ticks."""
+        running, ticks, tick_time, seconds_per_tick = self.state
+        if ticks < 0:
+            return 0.0
+        if running and seconds_per_tick:
+            now = self._now() if now is None else now
+            # never past the next tick, in case the clock has gone away
+            ticks += min(max((now - tick_time) / seconds_per_tick, 0.0), 1.0)
+        return ticks / TICKS_PER_BEAT
+
+    def phase(self, now=None):
+        """Return the position within the current beat, from 0 to 1."""
+        return self.beats(now) % 1
+
+
+def _slope(window):
+    """Least squares seconds per tick through [(tick, time)]."""
+    ticks, times = np.array(window).T
+    ticks -= ticks.mean()
+    return float(ticks @ (times - times.mean()) / (ticks @ ticks))
+
+
+class ControlMap(object):
+    """Maps control changes and notes to OSC addresses and values."""
+
+    def __init__(self, specs=()):
+        """Create a map from specs, as for add()."""
+        self._table = {}  # (status & 0xF0, channel 0-15, number) -> [(address, low, high)]
+        for spec in specs:
+            self.add(spec)
+
+    def add(self, spec):
+        """Add a mapping, KIND:CHANNEL:NUMBER=ADDRESS[:LOW:HIGH].
+
+        KIND is cc or note, CHANNEL 1 to 16 and NUMBER 0 to 127, or * for
+        any.  ADDRESS may be an OSC pattern.
+
+        """
+        try:
+            source, target = spec.split('=', 1)
+            kind, channel, number = source.split(':')
+            parts = target.split(':')
+            address = parts[0]
+            low, high = (float(parts[1]), float(parts[2])) if len(parts) == 3 else (0.0, 1.0)
+            if len(parts) not in (1, 3) or not address.startswith('/'):
+                raise ValueError
+            status = {'cc': CONTROL_CHANGE, 'note': NOTE_ON}[kind]
+            channels = range(16) if channel == '*' else [int(channel) - 1]
+            numbers = range(128) if number == '*' else [int(number)]
+            if not all(0 <= c < 16 for c in channels) or not all(0 <= n < 128 for n in numbers):
+                raise ValueError
+        except (ValueError, KeyError):
+            raise ValueError('MIDI mapping must be cc|note:CHANNEL:NUMBER=ADDRESS[:LOW:HIGH], '
+                             'not %r' % spec)
+        for c in channels:
+            for n in numbers:
+                self._table.setdefault((status, c, n), []).append((address, low, high))
+
+    def lookup(self, message):
+        """Return [(address, value)] for a channel message."""
+        status = message[0] & 0xF0
+        if status == NOTE_OFF or (status == NOTE_ON and message[2] == 0):
+            targets = self._table.get((NOTE_ON, message[0] & 0x0F, message[1]), ())
+            return [(address, low) for address, low, high in targets]
+        if status not in (NOTE_ON, CONTROL_CHANGE):
+            return []
+        targets = self._table.get((status, message[0] & 0x0F, message[1]), ())
+        return [(address, low + message[2] / 127 * (high - low))
+                for address, low, high in targets]
+
+
+class MidiInput(object):
+
+    def __init__(self, control_map=None, clock=None, now=time.monotonic):
+        self.control_map = control_map or ControlMap()
+        self.clock = clock or MidiClock(now=now)
+        self._now = now
+        self._parser = MidiParser()
+        self._pending = collections.deque()  # (address, value), appended by the reader
+        self.received = 0
+        self.thread = None
+
+    def handle(self, message, timestamp=None):
+        """Handle one parsed message which arrived at timestamp."""
+        self.received += 1
+        if message[0] >= 0xF0:
+            self.clock.handle(message, self._now() if timestamp is None else timestamp)
+        else:
+            self._pending.extend(self.control_map.lookup(message))
+
+    def feed(self, data, timestamp=None):
+        """Handle some raw MIDI bytes."""
+        if timestamp is None:
+            timestamp = self._now()
+        for message in self._parser.feed(data):
+            self.handle(message, timestamp)
+
+    def drain(self):
+        """Return the controls changed since the last drain, latest value
+        only, as messages for osc_dispatch.Dispatcher.dispatch()."""
+        latest = {}
+        popleft = self._pending.popleft
+        while True:
+            try:
+                address, value = popleft()
+            except IndexError:
+                break
+            latest[address] = value
+        return [(osc_dispatch.IMMEDIATELY, address, (value,))
+                for address, value in latest.items()]
+
+    def read_stream(self, stream, chunk=256):
+        """Read MIDI bytes from a binary file, device or pipe until it ends."""
+        read = getattr(stream, 'read1', stream.read)
+        while True:
+            data = read(chunk)
+            if not data:
+                return
+            self.feed(data)
+
+    def play_file(self, path, loop=False, clock=True, sleep=time.sleep):
+        """Play a Standard MIDI File in real time, with a MIDI clock if clock."""
+        events = read_smf(path, clock=clock)
+        while True:
+            start = self._now()
+            for seconds, message in events:
+                delay = start + seconds - self._now()
+                if delay > 0:
+                    sleep(delay)
+                self.handle(message, start + seconds)
+            if not loop or not events:
+                return
+
+    def open_port(self, name):
+        """Listen to the first python-rtmidi input port with name in its name."""
+        if rtmidi is None:
+            raise RuntimeError('MIDI ports need python-rtmidi: pip3 install python-rtmidi')
+        port = rtmidi.MidiIn()
+        names = port.get_ports()
+        for index, port_name in enumerate(names):
+            if name in port_name:
+                break
+        else:
+            raise ValueError('no MIDI input port like %r in %s' % (name, names))
+        port.open_port(index)
+        port.ignore_types(sysex=True, timing=False, active_sense=True)
+        port.set_callback(lambda event, data: self.feed(event[0]))
+        return port
+
+    def start(self, source, loop=False):
+        """Start reading source, as described in the module docstring."""
+        if source.startswith('port:'):
+            self.thread = self.open_port(source[len('port:'):])
+            return self.thread
+        if source.lower().endswith(('.mid', '.midi', '.smf')):
+            target, args = self.play_file, (source, loop)
+        elif source == '-':
+            target, args = self.read_stream, (sys.stdin.buffer,)
+        else:
+            target, args = self.read_stream, (open(source, 'rb', buffering=0),)
+        self.thread = threading.Thread(target=target, args=args, name='midi-input', daemon=True)
+        self.thread.start()
+        return self.thread
+
+
+#-------------------------------------------------------------------------------
+# Standard MIDI Files
+
+def _check_within(pos, end):
+    """Raise ValueError unless the bytes up to pos are there, before end."""
+    if pos > end:
+        raise ValueError('truncated MIDI file')
+
+
+def _read_varlen(data, pos, end):
+    value = 0
+    while True:
+        _check_within(pos + 1, end)
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def read_smf(path, clock=False):
+    """Return the events of a Standard MIDI File as [(seconds, message)] in
+    time order, all tracks merged.
+
+    clock: add MIDI clock ticks, 24 a beat on the file's tempo map, between
+        a Start at the beginning and a Stop at the end.
+
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != b'MThd':
+        raise ValueError('%s is not a Standard MIDI File' % path)
+    _check_within(14, len(data))
+    length, fmt, n_tracks, division = struct.unpack_from('>IHHH', data, 4)
+    if division & 0x8000:
+        raise ValueError('SMPTE time division is not supported')
+
+    events = []  # (tick, track, order, message), message 'tempo' events as (None, us)
+    pos = 8 + length
+    for track in range(n_tracks):
+        _check_within(pos + 8, len(data))
+        if data[pos:pos + 4] != b'MTrk':
+            raise ValueError('bad track chunk at byte %d' % pos)
+        end = pos + 8 + struct.unpack_from('>I', data, pos + 4)[0]
+        _check_within(end, len(data))
+        pos += 8
+        tick = 0
+        status = None
+        while pos < end:
+            delta, pos = _read_varlen(data, pos, end)
+            tick += delta
+            _check_within(pos + 1, end)
+            if data[pos] >= 0x80:
+                status = data[pos]
+                pos += 1
+            if status == 0xFF:
+                _check_within(pos + 1, end)
+                kind = data[pos]
+                size, pos = _read_varlen(data, pos + 1, end)
+                _check_within(pos + size, end)
+                if kind == 0x51 and size == 3:
+                    tempo = (data[pos] << 16) | (data[pos + 1] << 8) | data[pos + 2]
+                    events.append((tick, -1, len(events), (None, tempo)))
+                pos += size
+                if kind == 0x2F:
+                    break
+                status = None
+            elif status in (0xF0, 0xF7):
+                size, pos = _read_varlen(data, pos, end)
+                _check_within(pos + size, end)
+                pos += size
+                status = None
+            elif status is None:
+                raise ValueError('data byte without a status at byte %d' % pos)
+            else:
+                n = _data_length(status)
+                _check_within(pos + n, end)
+                events.append((tick, track, len(events), (status,) + tuple(data[pos:pos + n])))
+                pos += n
+        pos = end
+
+    if clock and events:
+        last = max(event[0] for event in events)
+        step = division / TICKS_PER_BEAT
+        events.append((0, -2, 0, (START,)))
+        events.extend((k * step, -1, k, (CLOCK,)) for k in range(int(last / step) + 1))
+        events.append((last, n_tracks, 0, (STOP,)))  # after everything else
+    events.sort(key=lambda event: event[:3])
+
+    # ticks to seconds, following the tempo changes
+    timed = []
+    seconds, last_tick, tempo = 0.0, 0, 500000  # microseconds per beat
+    for tick, track, order, message in events:
+        seconds += (tick - last_tick) * tempo / 1e6 / division
+        last_tick = tick
+        if message[0] is None:
+            tempo = message[1]
+        else:
+            timed.append((seconds, message))
+    return timed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Show what a MIDI source sends: mapped controls and the clock tempo')
+    parser.add_argument('source', help='a MIDI device, file or pipe, - for stdin, '
+                                       'a .mid file, or port:NAME')
+    parser.add_argument('--map', action='append', default=[], metavar='KIND:CHANNEL:NUMBER=ADDRESS',
+                        help='a control mapping, as for spiral_dj_control.py --midi_map')
+    parser.add_argument('--loop', action='store_true', help='loop a .mid file')
+    args = parser.parse_args()
+
+    try:
+        midi = MidiInput(ControlMap(args.map))
+    except ValueError as e:
+        parser.error(str(e))
+    midi.start(args.source, loop=args.loop)
+
+    try:
+        while True:
+            time.sleep(0.5)
+            for timetag, address, (value,) in midi.drain():
+                print('    %-24s %.3f' % (address, value))
+            bpm = midi.clock.bpm
+            if midi.clock.running and bpm:
+                print('%7.2f bpm  beat %8.2f' % (bpm, midi.clock.beats()))
+            thread = midi.thread
+            if isinstance(thread, threading.Thread) and not thread.is_alive():
+                break
+    except KeyboardInterrupt:
+        pass
+    print('%d messages' % midi.received)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Parameter smoothing and LFO modulation, evaluated once a frame as arrays.
+
+Controls straight from TouchOSC move in steps, and a step in a speed or
+period parameter makes the whole pattern jump.  A Modulation holds every
+control as a target, which the OSC side sets, and a value, which follows
+the target at no more than the control's slew rate, in units per second:
+
+    engine = modulation.Modulation({'/LeftBright': 1.0, '/XFader': 0.5}, slew=2.0)
+    engine.set_slew('/XFader', float('inf'))      # no smoothing
+
+It also runs low frequency oscillators, each a sine, saw, square or
+sample-and-hold random wave between -1 and 1, at a rate in cycles per
+second or, beat-synced, cycles per beat.  A modulation matrix adds each
+LFO, times a depth, to any controls:
+
+    wobble = engine.add_lfo('sine', rate=0.25)
+    pulse = engine.add_lfo('square', rate=1, beat_sync=True)
+    engine.route(wobble, '/XFader', 0.3)
+    engine.route(pulse, '/LeftBright', 0.2)
+
+Once a frame, hand it the latest targets and the frame time:
+
+    engine.set_targets(store.snapshot())    # or set_target(name, value)
+    engine.update(t)
+    controls = engine.as_dict()
+
+update() works on whole arrays: the slew of every control, every LFO and
+the matrix product cost a handful of numpy calls a frame however many
+there are, and nothing is added to the per-pixel work.
+
+"""
+
+from __future__ import division
+import math
+
+import numpy as np
+
+SINE, SAW, SQUARE, RANDOM = range(4)
+SHAPES = {'sine': SINE, 'saw': SAW, 'square': SQUARE, 'random': RANDOM}
+
+
+class Modulation(object):
+
+    def __init__(self, defaults, slew=float('inf'), bpm=120.0, seed=None):
+        """Create an engine for the controls in defaults, {name: value}.
+
+        slew: the slew rate of every control, in units per second, until
+            set_slew() changes it.  inf follows the target at once.
+        bpm: the tempo for beat-synced LFOs when update() isn't given beats.
+
+        """
+        self.names = list(defaults)
+        self.index = dict((name, ii) for ii, name in enumerate(self.names))
+        self.targets = np.array([defaults[name] for name in self.names], dtype=float)
+        self.values = self.targets.copy()
+        self.slew = np.full(len(self.names), float(slew))
+        self.output = self.values.copy()
+        self.bpm = bpm
+        self._last_t = None
+        self._step = np.empty(len(self.names))
+        self._rng = np.random.default_rng(seed)
+
+        self.lfo_names = []
+        self.shapes = np.zeros(0, dtype=np.intp)
+        self.rates = np.zeros(0)
+        self.phases = np.zeros(0)
+        self.synced = np.zeros(0, dtype=bool)
+        self.lfo_values = np.zeros(0)
+        self.matrix = np.zeros((len(self.names), 0))  # control x LFO depths
+        self._cycles = np.zeros(0)
+        self._held = np.zeros(0)
+
+    def set_target(self, name, value):
+        self.targets[self.index[name]] = value
+
+    def set_targets(self, values):
+        """Set every target from values in names order, for example the
+        snapshot of a ControlStore made from the same defaults."""
+        np.copyto(self.targets, values)
+
+    def set_slew(self, name, rate):
+        """Set the slew rate of name, in units per second."""
+        self.slew[self.index[name]] = rate
+
+    def add_lfo(self, shape='sine', rate=1.0, phase=0.0, beat_sync=False, name=None):
+        """Add an LFO and return its index, for route().
+
+        shape: 'sine', 'saw', 'square' or 'random'.
+        rate: cycles per second, or per beat when beat_sync is true.
+        phase: where in its cycle the LFO starts, from 0 to 1.
+
+        """
+        if shape not in SHAPES:
+            raise ValueError('LFO shape must be one of %s, not %r'
+                             % (', '.join(sorted(SHAPES)), shape))
+        index = len(self.lfo_names)
+        self.lfo_names.append(name or '%s%d' % (shape, index))
+        self.shapes = np.append(self.shapes, SHAPES[shape])
+        self.rates = np.append(self.rates, rate)
+        self.phases = np.append(self.phases, phase)
+        self.synced = np.append(self.synced, beat_sync)
+        self.lfo_values = np.append(self.lfo_values, 0.0)
+        self.matrix = np.hstack([self.matrix, np.zeros((len(self.names), 1))])
+        self._cycles = np.append(self._cycles, np.nan)
+        self._held = np.append(self._held, 0.0)
+        return index
+
+    def route(self, lfo, name, depth):
+        """Add depth times LFO number lfo to the control name.  A depth of 0
+        removes the route."""
+        self.matrix[self.index[name], lfo] = depth
+
+    def add_route(self, spec):
+        """Add an LFO and its route from a command line spec,
+        SHAPE:RATE:NAME:DEPTH, where a RATE ending in b is per beat:
+
+            sine:0.25:/XFader:0.3
+            square:1b:/LeftBright:0.2
+
+        Returns the LFO's index.
+
+        """
+        try:
+            shape, rate, rest = spec.split(':', 2)
+            name, depth = rest.rsplit(':', 1)
+            beat_sync = rate.endswith('b')
+            rate, depth = float(rate.rstrip('b')), float(depth)
+        except ValueError:
+            raise ValueError('LFO route must be SHAPE:RATE[b]:NAME:DEPTH, not %r' % spec)
+        if name not in self.index:
+            raise ValueError('no control named %r to route an LFO to' % name)
+        lfo = self.add_lfo(shape, rate, beat_sync=beat_sync)
+        self.route(lfo, name, depth)
+        return lfo
+
+    def update(self, t, beats=None):
+        """Advance to frame time t and return the output of every control.
+
+        beats: the musical time, for beat-synced LFOs.  By default it is
+            worked out from t and bpm.
+
+        """
+        dt = 0.0 if self._last_t is None else max(t - self._last_t, 0.0)
+        self._last_t = t
+
+        # move each value towards its target by at most slew * dt
+        step = self._step
+        with np.errstate(invalid='ignore'):
+            np.multiply(self.slew, dt, out=step)
+        step[np.isnan(step)] = np.inf  # an infinite rate moves at once, even when dt is 0
+        delta = self.targets - self.values
+        np.clip(delta, -step, step, out=delta)
+        self.values += delta
+
+        np.copyto(self.output, self.values)
+        if len(self.lfo_names):
+            self._update_lfos(t, t * self.bpm / 60 if beats is None else beats)
+            self.output += self.matrix @ self.lfo_values
+        return self.output
+
+    def _update_lfos(self, t, beats):
+        position = np.where(self.synced, beats, t) * self.rates + self.phases
+        cycles = np.floor(position)
+        phase = position - cycles
+
+        # random LFOs hold a new value for each cycle
+        new = cycles != self._cycles
+        if new.any():
+            self._held[new] = self._rng.uniform(-1, 1, np.count_nonzero(new))
+            self._cycles = cycles
+
+        waves = np.stack([
+            np.sin(2 * math.pi * phase),
+            2 * phase - 1,
+            np.where(phase < 0.5, 1.0, -1.0),
+            self._held,
+            ])
+        self.lfo_values = waves[self.shapes, np.arange(len(self.shapes))]
+
+    def as_dict(self):
+        """Return {name: output value} as of the last update()."""
+        return dict(zip(self.names, self.output.tolist()))
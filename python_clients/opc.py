@@ -33,13 +33,239 @@ Recommended use:
 
 """
 
+import collections
 import socket
 import struct
 import sys
+import threading
+import time
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _is_buffer(pixels):
+    """Return True if pixels is a numpy array or supports the buffer protocol."""
+    if isinstance(pixels, (list, tuple)):
+        return False
+    if np is not None and isinstance(pixels, np.ndarray):
+        return True
+    try:
+        memoryview(pixels)
+    except TypeError:
+        return False
+    return True
+
+
+def _sendall_parts(sock, parts):
+    """Like sock.sendall, for a list of buffers sent as one stream.
+
+    Uses scatter/gather sendmsg where available, so slices of a frame can
+    be sent behind their headers without being copied together first.
+
+    """
+    if not hasattr(sock, 'sendmsg'):
+        for part in parts:
+            sock.sendall(part)
+        return
+    parts = [memoryview(part).cast('B') for part in parts]
+    while parts:
+        sent = sock.sendmsg(parts)
+        while parts and sent >= len(parts[0]):
+            sent -= len(parts[0])
+            parts.pop(0)
+        if sent:
+            parts[0] = parts[0][sent:]
+
+
+def _pack(pixels, channel, buffer):
+    """Build the OPC message for pixels, returning bytes or a memoryview.
+
+    Numpy and buffer frames are packed into buffer, a _MessageBuffer.
+
+    """
+    if _is_buffer(pixels):
+        return buffer.pack(pixels, channel)
+
+    # build OPC message
+    len_hi_byte = int(len(pixels)*3 / 256)
+    len_lo_byte = (len(pixels)*3) % 256
+    command = 0  # set pixel colors from openpixelcontrol.org
+
+    header = struct.pack("BBBB", channel, command, len_hi_byte, len_lo_byte)
+
+    pieces = [ struct.pack( "BBB",
+                 min(255, max(0, int(r))),
+                 min(255, max(0, int(g))),
+                 min(255, max(0, int(b)))) for r, g, b in pixels ]
+
+    if sys.version_info[0] == 3:
+        # bytes!
+        message = header + b''.join(pieces)
+    else:
+        # strings!
+        message = header + ''.join(pieces)
+    return message
+
+
+class _NoTimers(object):
+    """Stands in for a stage_timers.StageTimers when a client has none."""
+
+    def now(self):
+        return 0
+
+    def lap(self, name, start):
+        return 0
+
+    def add_counter(self, name, read):
+        pass
+
+_NO_TIMERS = _NoTimers()
+
+
+class _MessageBuffer(object):
+    """A reusable OPC message: a 4 byte header followed by the pixel bytes.
+
+    The underlying bytearray is only reallocated when the number of pixels
+    changes, so steady-state packing of numpy frames does not allocate.
+
+    """
+
+    def __init__(self):
+        self._allocate(0)
+
+    def _allocate(self, n_bytes):
+        self._data = bytearray(4 + n_bytes)
+        self._view = memoryview(self._data)
+        self.body = self._view[4:]
+        if np is not None:
+            self.array = np.frombuffer(self._data, dtype=np.uint8, offset=4)
+        else:
+            self.array = None
+
+    def pack(self, pixels, channel=0, command=0):
+        """Pack an (N, 3) array or a buffer of rgb bytes into the message.
+
+        Numpy arrays are clipped to 0-255 and cast to bytes in one step.
+        Any other buffer-protocol object with a byte format is copied as-is.
+
+        Returns a memoryview of the complete message.
+
+        """
+        n_bytes = self.pack_body(pixels)
+        if n_bytes > 0xffff:
+            raise ValueError('too many pixels for one OPC message: %d' % (n_bytes // 3))
+        struct.pack_into('>BBH', self._data, 0, channel, command, n_bytes)
+        return self._view
+
+    def pack_body(self, pixels):
+        """Pack pixels like pack(), but leave the header alone.
+
+        There is no limit on the number of pixels, so this can hold a frame
+        that is later sliced into several messages.
+
+        Returns the number of bytes in the body.
+
+        """
+        if np is not None and isinstance(pixels, np.ndarray):
+            view = None
+        else:
+            view = memoryview(pixels)
+            if view.format not in ('B', 'b', 'c'):
+                if np is None:
+                    raise TypeError('numpy is required to pack %r buffers' % view.format)
+                pixels, view = np.asarray(view), None
+
+        n_bytes = pixels.size if view is None else view.nbytes
+        if n_bytes != len(self.body):
+            self._allocate(n_bytes)
+
+        if view is not None:
+            self.body[:] = view.cast('B')
+        elif pixels.dtype == np.uint8:
+            np.copyto(self.array.reshape(pixels.shape), pixels)
+        else:
+            np.clip(pixels, 0, 255, out=self.array.reshape(pixels.shape), casting='unsafe')
+        return n_bytes
+
+
+class FrameSender(object):
+    """Sends frames from a background thread, always the newest one.
+
+    submit() hands a frame over and returns immediately.  If the previous
+    frame has not been picked up by the thread yet it is dropped, never
+    queued, so a slow server only ever costs frames and not latency.
+
+    send(frame) is called on the thread and returns True on success.
+    release(frame), if given, is called once a frame is sent or dropped so
+    its buffer can be reused.
+
+    """
+
+    def __init__(self, send, release=None, name='opc-sender'):
+        self._send = send
+        self._release = release
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_ok = True
+
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, frame):
+        """Make frame the next one to send, dropping any frame still waiting."""
+        with self._cond:
+            if self._closed:
+                raise ValueError('submit() on a closed FrameSender')
+            stale, self._pending = self._pending, frame
+            if stale is not None:
+                self.dropped += 1
+            self._cond.notify()
+        if stale is not None and self._release:
+            self._release(stale)
+
+    def close(self):
+        """Send the frame still waiting, if any, and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                frame, self._pending = self._pending, None
+            self.last_ok = self._send(frame)
+            if self.last_ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            if self._release:
+                self._release(frame)
+
 
 class Client(object):
 
-    def __init__(self, server_ip_port, long_connection=True, verbose=False):
+    def __init__(self, server_ip_port, long_connection=True, verbose=False,
+                 threaded=False, skip_unchanged=False, keepalive=1.0, recorder=None,
+                 timers=None):
         """Create an OPC client object which sends pixels to an OPC server.
 
         server_ip_port should be an ip:port or hostname:port as a single string.
@@ -60,6 +286,28 @@ class Client(object):
 
         If verbose is True, the client will print debugging info to the console.
 
+        If threaded is True, put_pixels only packs the frame and hands it to
+        a background thread which does the connecting and sending, so a slow
+        server never stalls the render loop.  Only the newest frame is sent;
+        frames the thread had no time for are dropped and counted in
+        frames_dropped.  Call close() to send the last frame and stop the
+        thread.
+
+        If skip_unchanged is True, each frame is compared with the last one
+        sent.  A byte-identical frame is not sent (and counted in
+        frames_skipped) unless keepalive seconds have passed since the last
+        send, so the server still hears from us now and then.  After each
+        put_pixels, last_changed_pixels holds how many pixels differed.
+
+        If recorder is given, for example an opc_record.Recorder, every
+        message put_pixels packs is also passed to recorder.write(message),
+        whether or not it is sent.
+
+        If timers is given, a stage_timers.StageTimers, the time put_pixels
+        spends packing each frame is recorded as the 'pack' stage and the
+        time spent sending it as 'send', and the frames dropped and skipped
+        are added as counters.
+
         """
         self.verbose = verbose
 
@@ -70,6 +318,32 @@ class Client(object):
 
         self._socket = None  # will be None when we're not connected
 
+        self._message = _MessageBuffer()  # reused by put_pixels for numpy frames
+
+        self._sender = None
+        if threaded:
+            # one buffer being packed, one waiting and one being sent
+            self._free_messages = collections.deque(_MessageBuffer() for ii in range(3))
+            self._sender = FrameSender(self._send_frame, self._release_frame)
+
+        self._skip_unchanged = skip_unchanged
+        self.keepalive = keepalive
+        self._previous = bytearray()  # the last message sent
+        self._previous_time = 0
+        self.last_changed_pixels = None
+        self.frames_skipped = 0
+
+        self.recorder = recorder
+
+        self.timers = timers or _NO_TIMERS
+        self.timers.add_counter('frames_dropped', lambda: self.frames_dropped)
+        self.timers.add_counter('frames_skipped', lambda: self.frames_skipped)
+
+    @property
+    def frames_dropped(self):
+        """Frames replaced by a newer one before the sender thread got to them."""
+        return self._sender.dropped if self._sender else 0
+
     def _debug(self, m):
         if self.verbose:
             print('    %s' % str(m))
@@ -116,6 +390,16 @@ class Client(object):
             self.disconnect()
         return success
 
+    def close(self):
+        """Stop the sender thread, if there is one, and disconnect.
+
+        A threaded client can't send any more frames once it is closed.
+
+        """
+        if self._sender:
+            self._sender.close()
+        self.disconnect()
+
     def put_pixels(self, pixels, channel=0):
         """Send the list of pixel colors to the OPC server on the given channel.
 
@@ -128,48 +412,130 @@ class Client(object):
             For example: [(255, 255, 255), (0, 0, 0), (127, 0, 0)]
             Floats will be rounded down to integers.
             Values outside the legal range will be clamped.
+            An (N, 3) numpy array is also accepted and is packed without
+            building any intermediate Python objects, as is any
+            buffer-protocol object (bytes, bytearray, array.array('B'))
+            holding ready-made rgb bytes.
 
         Will establish a connection to the server as needed.
 
         On successful transmission of pixels, return True.
         On failure (bad connection), return False.
+        In threaded mode the frame is sent later, and the return value is
+        the result of the most recent send.
 
         The list of pixel colors will be applied to the LED string starting
         with the first LED.  It's not possible to send a color just to one
         LED at a time (unless it's the first one).
 
         """
+        if self._sender:
+            buffer = self._free_messages.pop()
+            start = self.timers.now()
+            message = self._pack(pixels, channel, buffer)
+            self.timers.lap('pack', start)
+            if self.recorder is not None:
+                self.recorder.write(message)
+            return self._submit(buffer, message)
+
+        start = self.timers.now()
+        message = self._pack(pixels, channel)
+        self.timers.lap('pack', start)
+        if self.recorder is not None:
+            self.recorder.write(message)
+        return self.put_message(message)
+
+    def put_message(self, message):
+        """Send a ready-made OPC message, header and all, to the server.
+
+        message: a bytes-like object, for example a slice of a recording
+            made with opc_record.  It is sent as it is.
+
+        Connecting, skip_unchanged and the return value work as in
+        put_pixels.  In threaded mode message must not change until the
+        sender thread has sent it.
+
+        """
+        if self._sender:
+            return self._submit(None, message)
+
+        if self._skip_unchanged and not self._frame_changed(message):
+            return True
+
         self._debug('put_pixels: connecting')
         is_connected = self._ensure_connected()
         if not is_connected:
             self._debug('put_pixels: not connected.  ignoring these pixels.')
+            self._previous = bytearray()
             return False
 
-        # build OPC message
-        len_hi_byte = int(len(pixels)*3 / 256)
-        len_lo_byte = (len(pixels)*3) % 256
-        command = 0  # set pixel colors from openpixelcontrol.org
+        return self._send_message(message)
 
-        header = struct.pack("BBBB", channel, command, len_hi_byte, len_lo_byte)
+    def _frame_changed(self, message):
+        """Diff message against the last one sent and decide whether to send it.
 
-        pieces = [ struct.pack( "BBB",
-                     min(255, max(0, int(r))),
-                     min(255, max(0, int(g))),
-                     min(255, max(0, int(b)))) for r, g, b in pixels ]
+        Sets last_changed_pixels, and remembers message if it is to be sent.
+
+        """
+        previous = self._previous
+        n_bytes = len(message) - 4
+        identical = len(message) == len(previous) and message == previous
+        if identical:
+            changed = 0
+        elif len(message) != len(previous):
+            changed = n_bytes // 3
+        elif np is not None:
+            diff = (np.frombuffer(message, np.uint8, n_bytes, 4) !=
+                    np.frombuffer(previous, np.uint8, n_bytes, 4))
+            changed = int(np.count_nonzero(diff.reshape(-1, 3).any(axis=1)))
+        else:
+            changed = sum(1 for ii in range(4, len(message), 3)
+                          if message[ii:ii+3] != previous[ii:ii+3])
+        self.last_changed_pixels = changed
+
+        now = time.monotonic()
+        if identical and now - self._previous_time < self.keepalive:
+            self._debug('put_pixels: frame unchanged.  skipping it.')
+            self.frames_skipped += 1
+            return False
+        self._previous[:] = message
+        self._previous_time = now
+        return True
 
-        if sys.version_info[0] == 3:
-            # bytes!
-            message = header + b''.join(pieces)
+    def _submit(self, buffer, message):
+        """Hand message, packed in buffer (or None), to the sender thread."""
+        if self._skip_unchanged and not self._frame_changed(message):
+            self._release_frame((buffer, message))
         else:
-            # strings!
-            message = header + ''.join(pieces)
+            self._sender.submit((buffer, message))
+        return self._sender.last_ok
 
+    def _send_frame(self, frame):
+        """Send a (buffer, message) pair handed over by put_pixels."""
+        buffer, message = frame
+        if not self._ensure_connected():
+            self._debug('put_pixels: not connected.  ignoring these pixels.')
+            return False
+        return self._send_message(message)
+
+    def _release_frame(self, frame):
+        if frame[0] is not None:
+            self._free_messages.append(frame[0])
+
+    def _send_message(self, message):
+        """Send a packed message, or a list of buffers, over the open connection."""
         self._debug('put_pixels: sending pixels to server')
+        start = self.timers.now()
         try:
-            self._socket.send(message)
+            if isinstance(message, list):
+                _sendall_parts(self._socket, message)
+            else:
+                self._socket.sendall(message)
+            self.timers.lap('send', start)
         except socket.error:
             self._debug('put_pixels: connection lost.  could not send pixels.')
             self._socket = None
+            self._previous = bytearray()  # make sure the next frame goes out
             return False
 
         if not self._long_connection:
@@ -178,4 +544,224 @@ class Client(object):
 
         return True
 
+    def _pack(self, pixels, channel, buffer=None):
+        """Build the OPC message for pixels, in buffer or the client's own one."""
+        return _pack(pixels, channel, buffer or self._message)
+
+
+class FanoutClient(object):
+
+    def __init__(self, targets, long_connection=True, verbose=False):
+        """Create a client which splits each frame across several OPC servers.
+
+        targets: a mapping from (start, stop) ranges of pixel indices in the
+            frame to (server_ip_port, channel) pairs.  For example
+
+                {(0, 512):    ('10.0.0.2:7890', 1),
+                 (512, 1024): ('10.0.0.2:7890', 2),
+                 (1024, 3250): ('10.0.0.3:7890', 1)}
+
+        Each server gets one connection and one sender thread, and all of a
+        server's channels go out together in one scatter/gather write
+        which points straight into the packed frame.  Servers are sent
+        newest-frame-wins like a threaded Client, so a slow server drops its
+        own frames without delaying the others.
+
+        """
+        if not targets:
+            raise ValueError('FanoutClient needs at least one target')
+        self.verbose = verbose
+        self._targets = {}  # server -> [(start, stop, channel)]
+        for (start, stop), (server, channel) in sorted(targets.items()):
+            if not 0 <= start < stop or (stop - start) * 3 > 0xffff:
+                raise ValueError('bad pixel range %r for %s' % ((start, stop), server))
+            self._targets.setdefault(server, []).append((start, stop, channel))
+
+        self._clients = {}
+        self._senders = {}
+        for server in self._targets:
+            client = Client(server, long_connection=long_connection, verbose=verbose)
+            self._clients[server] = client
+            self._senders[server] = FrameSender(
+                client._send_frame, self._release_frame, name='opc-fanout %s' % server)
+
+        # frames in flight, each shared by every server until all have sent it
+        self._lock = threading.Lock()
+        self._free_messages = collections.deque()
+        self._refcounts = {}
+
+    def can_connect(self):
+        """Try to connect to every server.  Return True if all succeeded."""
+        return all([client.can_connect() for client in self._clients.values()])
+
+    def put_pixels(self, pixels, channel=None):
+        """Pack one frame and hand each server its slices of it.
+
+        pixels: an (N, 3) numpy array, a buffer of rgb bytes or a list of
+            rgb tuples, covering the whole layout.
+        channel: ignored; channels come from the targets.
+
+        Returns True if the most recent send to every server succeeded.
+
+        """
+        with self._lock:
+            buffer = self._free_messages.pop() if self._free_messages else _MessageBuffer()
+            self._refcounts[id(buffer)] = len(self._senders)
+        if not _is_buffer(pixels):
+            pixels = _tuples_to_buffer(pixels)
+        n_bytes = buffer.pack_body(pixels)
+
+        for server, ranges in self._targets.items():
+            parts = []
+            for start, stop, target_channel in ranges:
+                body = buffer.body[start*3:min(stop*3, n_bytes)]
+                parts.append(struct.pack('>BBH', target_channel, 0, len(body)))
+                parts.append(body)
+            self._senders[server].submit((buffer, parts))
+        return all([sender.last_ok for sender in self._senders.values()])
+
+    @property
+    def frames_dropped(self):
+        """A dict of frames each server was too slow for."""
+        return dict((server, sender.dropped) for server, sender in self._senders.items())
+
+    def close(self):
+        """Send the last frame to every server, stop the threads and disconnect."""
+        for sender in self._senders.values():
+            sender.close()
+        for client in self._clients.values():
+            client.disconnect()
+
+    def _release_frame(self, frame):
+        buffer = frame[0]
+        with self._lock:
+            self._refcounts[id(buffer)] -= 1
+            if self._refcounts[id(buffer)] == 0:
+                del self._refcounts[id(buffer)]
+                self._free_messages.append(buffer)
+
+
+def _tuples_to_buffer(pixels):
+    """Convert a list of rgb tuples to something _MessageBuffer can pack."""
+    if np is not None:
+        return np.asarray(pixels, dtype=float)
+    return bytearray(min(255, max(0, int(v))) for pixel in pixels for v in pixel)
+
+
+class AsyncClient(object):
+
+    def __init__(self, server_ip_port, high_water=1 << 16, connect_timeout=1.0,
+                 min_backoff=0.1, max_backoff=5.0, verbose=False):
+        """Create an asyncio OPC client for use inside an event loop.
+
+            client = opc.AsyncClient('localhost:7890')
+            while True:
+                await client.put_pixels(pattern.render(t))
+                await asyncio.sleep(1/30)
+
+        Nothing in put_pixels ever blocks the loop:
+        * Frames are written to the transport without waiting for them to
+          drain.  If more than high_water bytes are still queued for a slow
+          server, the frame is dropped instead and counted in frames_dropped.
+        * A lost or refused connection is retried in a background task,
+          started from put_pixels, with exponential backoff between
+          min_backoff and max_backoff seconds.  Frames sent while
+          disconnected are refused immediately rather than waiting for it.
+
+        Nagle's algorithm is turned off (TCP_NODELAY) so frames leave as
+        soon as they are written.
+
+        """
+        if asyncio is None:
+            raise RuntimeError('AsyncClient needs asyncio (Python 3)')
+        self.verbose = verbose
+
+        self._ip, self._port = server_ip_port.split(':')
+        self._port = int(self._port)
+
+        self.high_water = high_water
+        self.connect_timeout = connect_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._writer = None  # will be None when we're not connected
+        self._connecting = None  # the background reconnection task, if any
+        self._backoff = 0
+        self._next_attempt = 0
+
+        self._message = _MessageBuffer()
+
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def _debug(self, m):
+        if self.verbose:
+            print('    %s' % str(m))
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """Connect to the server if not already connected, ignoring any backoff.
+
+        Return True on success or False on failure.
+
+        """
+        if self.connected:
+            return True
+        self._writer = None
+
+        loop = asyncio.get_event_loop()
+        try:
+            self._debug('connect: trying to connect...')
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self._ip, self._port), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError):
+            self._backoff = min(self.max_backoff, max(self.min_backoff, self._backoff * 2))
+            self._next_attempt = loop.time() + self._backoff
+            self._debug('connect:    ...failure, retrying in %.1fs' % self._backoff)
+            return False
+
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._writer = writer
+        self._backoff = 0
+        self._debug('connect:    ...success')
+        return True
+
+    async def put_pixels(self, pixels, channel=0):
+        """Send pixels to the server on the given channel, like Client.put_pixels.
+
+        Return True if the frame was written to the connection, or False if
+        there is no connection yet or the frame was dropped because the
+        server is not keeping up.
+
+        """
+        if not self.connected:
+            loop = asyncio.get_event_loop()
+            connecting = self._connecting
+            if (connecting is None or connecting.done()) and loop.time() >= self._next_attempt:
+                self._connecting = loop.create_task(self.connect())
+            return False
+
+        if self._writer.transport.get_write_buffer_size() > self.high_water:
+            self._debug('put_pixels: server is behind.  dropping this frame.')
+            self.frames_dropped += 1
+            return False
 
+        # the transport copies whatever it can't send right away, so the
+        # message buffer is free to be reused for the next frame
+        self._writer.write(_pack(pixels, channel, self._message))
+        self.frames_sent += 1
+        return True
+
+    def close(self):
+        """Drop the connection to the server, if there is one."""
+        if self._connecting is not None:
+            self._connecting.cancel()
+            self._connecting = None
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+"""An OPC proxy which mixes the frames of several pattern clients into one.
+
+gl_server and the hardware servers show whichever client connected last.
+Point several patterns at the mixer instead, and the mixer at the server:
+
+    bin/gl_server layouts/wall.json 7890
+    python_clients/opc_mixer.py --listen 0.0.0.0:7891 --server 127.0.0.1:7890
+    python_clients/raver_plaid.py 127.0.0.1:7891
+    python_clients/run_pattern.py lava_lamp --layout layouts/wall.json --server 127.0.0.1:7891
+
+Each client that connects takes the lowest free source slot, 0, 1, 2...
+The mixer keeps the latest frame from every source and, at a fixed frame
+rate, blends them with per-source weights in one vectorized pass:
+
+    add:    the weighted sum of all sources
+    max:    the highest weighted value of each channel (HTP)
+    alpha:  sources layered in slot order, each weight an opacity
+
+The weights can be set over OSC, with the same crossfader as
+spiral_dj_control.py:
+
+    /XFader f               crossfade between sources 0 (f=0) and 1 (f=1)
+    /mixer/weight/<slot> f  set the weight of one source
+    /mixer/mode s           add, max or alpha
+
+"""
+
+from __future__ import division
+import asyncio
+import optparse
+import sys
+
+import numpy as np
+
+import frame_clock
+import opc
+import opc_server
+import osc_dispatch
+
+ADD = 'add'
+MAX = 'max'
+ALPHA = 'alpha'
+MODES = (ADD, MAX, ALPHA)
+
+
+class Mixer(object):
+
+    def __init__(self, n_pixels, max_sources=8, mode=ADD):
+        """Create a mixer for frames of n_pixels from up to max_sources clients."""
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s, not %r' % (', '.join(MODES), mode))
+        self.n_pixels = n_pixels
+        self.mode = mode
+        self.frames = np.zeros((max_sources, n_pixels, 3), dtype=np.float32)
+        self.weights = np.ones(max_sources, dtype=np.float32)
+        self.active = np.zeros(max_sources, dtype=bool)
+        self.out = np.zeros((n_pixels, 3), dtype=np.float32)
+        self._slots = {}  # ClientConnection -> slot
+
+    def handle_frame(self, client, channel, command, data):
+        """An opc_server handler which stores the frame as its client's latest."""
+        if command != 0:
+            return
+        slot = self._slots.get(client)
+        if slot is None:
+            slot = self._add_source(client)
+            if slot is None:
+                return
+        pixels = np.frombuffer(data, dtype=np.uint8)
+        n = min(len(pixels) // 3, self.n_pixels)
+        frame = self.frames[slot]
+        frame[:n] = pixels[:n*3].reshape(n, 3)
+        frame[n:] = 0
+
+    def _add_source(self, client):
+        free = np.flatnonzero(~self.active)
+        if not len(free):
+            return None
+        slot = int(free[0])
+        self._slots[client] = slot
+        self.active[slot] = True
+        self.frames[slot] = 0
+        return slot
+
+    def remove_closed(self, open_clients):
+        """Free the slots of clients that are no longer in open_clients."""
+        for client in list(self._slots):
+            if client not in open_clients:
+                self.active[self._slots.pop(client)] = False
+
+    def set_weight(self, slot, weight):
+        self.weights[slot] = weight
+
+    def set_crossfade(self, x):
+        """Crossfade from source 0 (x=0) to source 1 (x=1)."""
+        self.weights[0] = 1 - x
+        self.weights[1] = x
+
+    def set_mode(self, mode):
+        if mode not in MODES:
+            raise ValueError('mode must be one of %s, not %r' % (', '.join(MODES), mode))
+        self.mode = mode
+
+    def blend(self):
+        """Blend the latest frames of the active sources into self.out and return it."""
+        weights = np.where(self.active, np.clip(self.weights, 0, 1), 0)
+        if self.mode == MAX:
+            np.max(self.frames * weights[:, np.newaxis, np.newaxis], axis=0, out=self.out)
+            return self.out
+        if self.mode == ALPHA:
+            # each layer is covered by the opacity of every layer above it
+            above = np.cumprod((1 - weights)[::-1])[::-1]
+            weights = weights * np.append(above[1:], 1)
+        np.einsum('s,snc->nc', weights.astype(np.float32), self.frames, out=self.out)
+        return self.out
+
+
+def parse_address(address, default_host='0.0.0.0'):
+    host, port = address.rsplit(':', 1) if ':' in address else (default_host, address)
+    return host, int(port)
+
+
+def make_osc_dispatcher(mixer):
+    """Map the mixer's OSC addresses onto an osc_dispatch.Dispatcher."""
+    dispatcher = osc_dispatch.Dispatcher()
+
+    def on_xfader(address, value, *args):
+        mixer.set_crossfade(min(1.0, max(0.0, value)))
+
+    def on_weight(address, value, *args):
+        slot = int(address.rsplit('/', 1)[1])
+        if 0 <= slot < len(mixer.weights):
+            mixer.set_weight(slot, value)
+
+    def on_mode(address, value, *args):
+        try:
+            mixer.set_mode(str(value))
+        except ValueError as e:
+            print('    %s' % e)
+
+    dispatcher.map('/XFader', on_xfader)
+    dispatcher.map('/mixer/weight/*', on_weight)
+    dispatcher.map('/mixer/mode', on_mode)
+    return dispatcher
+
+
+async def run(options):
+    mixer = Mixer(options.pixel_count, max_sources=options.sources, mode=options.mode)
+
+    host, port = parse_address(options.listen)
+    server = opc_server.Server(mixer.handle_frame, host=host, port=port)
+    await server.start()
+    print('    mixing OPC from %s:%d' % (host, server.port))
+
+    if options.osc:
+        osc_host, osc_port = parse_address(options.osc)
+        await osc_dispatch.serve(make_osc_dispatcher(mixer), (osc_host, osc_port))
+        print('    listening for OSC on %s:%d' % (osc_host, osc_port))
+
+    client = opc.AsyncClient(options.server)
+    print('    sending to %s (control-c to exit)...' % options.server)
+
+    clock = frame_clock.FrameClock(options.fps)
+    while True:
+        await clock.tick_async()
+        mixer.remove_closed(server.clients)
+        await client.put_pixels(mixer.blend(), channel=0)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-l', '--listen', dest='listen', default='0.0.0.0:7891',
+                        action='store', type='string',
+                        help='ip:port to accept pattern clients on')
+    parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
+                        action='store', type='string',
+                        help='ip:port of the OPC server to send the mix to')
+    parser.add_option('-n', '--pixel_count', dest='pixel_count', default=512,
+                        action='store', type='int',
+                        help='number of pixels in each frame')
+    parser.add_option('-f', '--fps', dest='fps', default=30,
+                        action='store', type='int',
+                        help='frames per second sent to the server')
+    parser.add_option('-m', '--mode', dest='mode', default=ADD,
+                        action='store', type='choice', choices=MODES,
+                        help='blend mode: add, max or alpha (default add)')
+    parser.add_option('--sources', dest='sources', default=8,
+                        action='store', type='int',
+                        help='most pattern clients mixed at once')
+    parser.add_option('-o', '--osc', dest='osc',
+                        action='store', type='string',
+                        help='ip:port to listen for OSC control on, e.g. 0.0.0.0:5006')
+    options, args = parser.parse_args()
+
+    try:
+        asyncio.run(run(options))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
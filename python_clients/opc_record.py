@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+"""Record OPC frames to a file and play them back without the renderers.
+
+A recording is an append-only binary file.  After an 8 byte magic number
+each record is
+
+    timestamp   float64, monotonic seconds since the recording started
+    length      uint32, length of the message that follows
+    message     the OPC message exactly as sent: channel, command,
+                body length and the raw rgb bytes
+
+When the recording is closed an index of every record's timestamp, message
+offset and length is appended, followed by a trailer pointing at it, so a
+player can seek without reading the records.  A recording that was never
+closed (the show crashed) is still playable: its index is rebuilt by
+walking the records once.
+
+To record the frames of a live set, pass a Recorder to opc.Client:
+
+    recorder = opc_record.Recorder('set.opcrec')
+    client = opc.Client('127.0.0.1:7890', recorder=recorder)
+    ...
+    recorder.close()
+
+or put the recorder between the patterns and the server, as an OPC server
+which records everything any client sends it:
+
+    python_clients/opc_record.py record set.opcrec --port 7891
+
+To play a recording back to a server, with the original timing:
+
+    python_clients/opc_record.py play set.opcrec --server 127.0.0.1:7890
+    python_clients/opc_record.py play set.opcrec --seek 60 --speed 0.5 --loop
+
+The player memory-maps the file and sends each message straight from the
+map, so playing costs no parsing or copying per frame.
+
+"""
+
+from __future__ import division
+import mmap
+import optparse
+import struct
+import time
+
+import numpy as np
+
+import opc
+
+MAGIC = b'OPCREC01'
+INDEX_MAGIC = b'OPCIDX01'
+END_MAGIC = b'OPCEND01'
+
+_RECORD = struct.Struct('<dI')     # timestamp, message length
+_INDEX = struct.Struct('<8sQ')     # magic, number of records
+_TRAILER = struct.Struct('<Q8s')   # offset of the index, magic
+
+
+class Recorder(object):
+
+    def __init__(self, path, now=time.monotonic):
+        """Start a new recording at path, replacing any file there.
+
+        now: the clock to timestamp frames with, replaceable for testing.
+
+        """
+        self.path = path
+        self._now = now
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC)
+        self._position = len(MAGIC)
+        self._start = None
+        self._times = []
+        self._offsets = []
+        self._lengths = []
+
+    @property
+    def frames(self):
+        return len(self._times)
+
+    def write(self, message):
+        """Append one OPC message, timestamped now."""
+        now = self._now()
+        if self._start is None:
+            self._start = now
+        t = now - self._start
+        length = len(message)
+        self._file.write(_RECORD.pack(t, length))
+        self._file.write(message)
+
+        self._times.append(t)
+        self._offsets.append(self._position + _RECORD.size)
+        self._lengths.append(length)
+        self._position += _RECORD.size + length
+
+    def close(self):
+        """Write the index and close the file."""
+        if self._file is None:
+            return
+        index_offset = self._position
+        self._file.write(_INDEX.pack(INDEX_MAGIC, len(self._times)))
+        self._file.write(np.array(self._times, dtype='<f8').tobytes())
+        self._file.write(np.array(self._offsets, dtype='<u8').tobytes())
+        self._file.write(np.array(self._lengths, dtype='<u4').tobytes())
+        self._file.write(_TRAILER.pack(index_offset, END_MAGIC))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording(object):
+    """A memory-mapped recording.
+
+    times, offsets and lengths are arrays with one entry per frame, and
+    message(i) returns frame i as a memoryview into the map.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not an OPC recording' % path)
+        if not self._read_index():
+            self._scan()
+
+    def _read_index(self):
+        """Load the index written by Recorder.close().  Return False if there is none."""
+        size = len(self._map)
+        if size < len(MAGIC) + _INDEX.size + _TRAILER.size:
+            return False
+        index_offset, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        if magic != END_MAGIC:
+            return False
+        magic, n = _INDEX.unpack_from(self._map, index_offset)
+        if magic != INDEX_MAGIC:
+            return False
+        pos = index_offset + _INDEX.size
+        self.times = np.frombuffer(self._map, '<f8', n, pos)
+        self.offsets = np.frombuffer(self._map, '<u8', n, pos + 8 * n)
+        self.lengths = np.frombuffer(self._map, '<u4', n, pos + 16 * n)
+        return True
+
+    def _scan(self):
+        """Rebuild the index of an unfinished recording by walking its records."""
+        times, offsets, lengths = [], [], []
+        pos, size = len(MAGIC), len(self._map)
+        while pos + _RECORD.size <= size:
+            t, length = _RECORD.unpack_from(self._map, pos)
+            if pos + _RECORD.size + length > size:
+                break  # cut off mid-record
+            times.append(t)
+            offsets.append(pos + _RECORD.size)
+            lengths.append(length)
+            pos += _RECORD.size + length
+        self.times = np.array(times, dtype='<f8')
+        self.offsets = np.array(offsets, dtype='<u8')
+        self.lengths = np.array(lengths, dtype='<u4')
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def message(self, i):
+        offset = int(self.offsets[i])
+        return self._view[offset:offset + int(self.lengths[i])]
+
+    def frame_at(self, t):
+        """Return the index of the first frame at or after t seconds."""
+        return int(np.searchsorted(self.times, t))
+
+    def close(self):
+        # drop our views first, or the map can't be closed
+        self.times = self.offsets = self.lengths = None
+        self._view.release()
+        self._map.close()
+
+
+class Player(object):
+    """Sends the frames of a Recording to a client with their original timing.
+
+    speed scales the rate of playback, 2 for double speed.  seek() and
+    the speed can be changed between calls to play(), for example from a
+    control thread.
+
+    """
+
+    def __init__(self, recording, client, speed=1.0, loop=False,
+                 now=time.monotonic, sleep=time.sleep):
+        self.recording = recording
+        self.client = client
+        self.speed = speed
+        self.loop = loop
+        self._now = now
+        self._sleep = sleep
+        self.position = 0   # index of the next frame
+        self.frames_sent = 0
+        self.frames_late = 0  # frames sent a whole frame interval or more late
+
+    def seek(self, t):
+        """Continue playback from t seconds into the recording."""
+        self.position = min(self.recording.frame_at(t), len(self.recording))
+
+    def play(self, until=None):
+        """Send frames until the end of the recording, or until the given frame index.
+
+        With loop set, playback wraps around to the start instead of ending.
+
+        """
+        recording = self.recording
+        n = len(recording)
+        if not n:
+            return
+        times = recording.times
+        stop = n if until is None else min(until, n)
+
+        # the recording time of frame position is due now
+        base_t = times[self.position] if self.position < n else 0.0
+        base_now = self._now()
+        while True:
+            if self.position >= stop:
+                if not self.loop or until is not None:
+                    return
+                self.position = 0
+                base_t = times[0]
+                base_now = self._now()
+
+            due = base_now + (times[self.position] - base_t) / self.speed
+            now = self._now()
+            if now < due:
+                self._sleep(due - now)
+            elif self.position + 1 < n:
+                next_due = base_now + (times[self.position + 1] - base_t) / self.speed
+                if now >= next_due:
+                    self.frames_late += 1
+
+            self.client.put_message(recording.message(self.position))
+            self.frames_sent += 1
+            self.position += 1
+
+
+def record(path, host, port, interval):
+    """Run an OPC server which records every frame it is sent to path."""
+    import asyncio
+    import opc_server
+
+    def handler(client, channel, command, data):
+        recorder.write(opc_server.HEADER.pack(channel, command, len(data)) + data)
+
+    async def run():
+        server = opc_server.Server(handler, host=host, port=port)
+        await server.start()
+        print('    recording OPC from %s:%d to %s (control-c to stop)...' % (server.host, server.port, path))
+        while True:
+            await asyncio.sleep(interval)
+            print('    %d frames' % recorder.frames)
+
+    with Recorder(path) as recorder:
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            print('    %d frames recorded' % recorder.frames)
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog record|play file [options]')
+    parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
+                        action='store', type='string',
+                        help='play: ip and port of server')
+    parser.add_option('--seek', dest='seek', default=0,
+                        action='store', type='float',
+                        help='play: seconds into the recording to start at')
+    parser.add_option('--speed', dest='speed', default=1.0,
+                        action='store', type='float',
+                        help='play: playback speed, 2 for double speed')
+    parser.add_option('--loop', dest='loop', action='store_true',
+                        help='play: start again from the beginning at the end')
+    parser.add_option('-H', '--host', dest='host', default='0.0.0.0',
+                        action='store', type='string',
+                        help='record: address to listen on')
+    parser.add_option('-p', '--port', dest='port', default=7891,
+                        action='store', type='int',
+                        help='record: port to listen on')
+    options, args = parser.parse_args()
+
+    if len(args) != 2 or args[0] not in ('record', 'play'):
+        parser.error('usage: opc_record.py record|play file')
+    command, path = args
+
+    if command == 'record':
+        record(path, options.host, options.port, interval=5)
+        return
+
+    recording = Recording(path)
+    print('    %d frames, %.1f seconds' % (len(recording), recording.duration))
+    client = opc.Client(options.server)
+    if not client.can_connect():
+        print('    WARNING: could not connect to %s' % options.server)
+    player = Player(recording, client, speed=options.speed, loop=options.loop)
+    player.seek(options.seek)
+    print('    playing (control-c to exit)...')
+    try:
+        player.play()
+    except KeyboardInterrupt:
+        pass
+    print('    %d frames sent, %d late' % (player.frames_sent, player.frames_late))
+    client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+"""An asyncio Open Pixel Control server
+http://openpixelcontrol.org/
+
+A Python stand-in for the servers in src/, for load tests, benchmarks and
+anything that wants to consume OPC frames in Python: a proxy, a mixer or a
+recorder.  Any number of clients can connect at once.
+
+Each connection reads straight from the socket into one preallocated
+buffer (asyncio.BufferedProtocol, which uses recv_into) and parses every
+complete message in it without copying.  Each frame is passed to a
+handler as a memoryview which is only valid during the call:
+
+    def handler(client, channel, command, data):
+        pixels = numpy.frombuffer(data, numpy.uint8).reshape(-1, 3).copy()
+
+    server = opc_server.Server(handler, port=7890)
+    await server.start()
+
+Every connection keeps counters of frames, bytes and latency, the time
+from the first byte of a frame arriving to the handler returning.
+
+To run it as a sink which prints the counters every few seconds:
+
+    python_clients/opc_server.py --port 7890
+
+"""
+
+from __future__ import division
+import asyncio
+import collections
+import optparse
+import struct
+import sys
+import time
+
+HEADER = struct.Struct('>BBH')  # channel, command, length
+MAX_MESSAGE = HEADER.size + 0xffff
+MAX_FINISHED = 100  # ClientStats of closed connections kept
+
+
+class ClientStats(object):
+    """Counters for one connection."""
+
+    def __init__(self):
+        self.connected_time = time.time()
+        self.frames = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def add_frame(self, n_bytes, latency):
+        self.frames += 1
+        self.bytes += n_bytes
+        self.latency_total += latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    def as_dict(self):
+        elapsed = max(time.time() - self.connected_time, 1e-9)
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'fps': self.frames / elapsed,
+            'mbps': self.bytes * 8 / elapsed / 1e6,
+            'latency_mean': self.latency_total / self.frames if self.frames else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+
+class ClientConnection(asyncio.BufferedProtocol):
+    """Parses the OPC stream of one client and calls the server's handler."""
+
+    def __init__(self, server):
+        self.server = server
+        self.peer = None
+        self.transport = None
+        self.stats = ClientStats()
+
+        # room for one whole message left over plus one more read
+        self._buffer = bytearray(2 * MAX_MESSAGE)
+        self._view = memoryview(self._buffer)
+        self._end = 0
+        self._partial_since = None  # when the first byte of an incomplete message arrived
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info('peername')
+        self.server.clients.append(self)
+
+    def connection_lost(self, exc):
+        self.server.clients.remove(self)
+        self.server.finished.append(self.stats)
+
+    def get_buffer(self, sizehint):
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes):
+        now = time.perf_counter()
+        start = self._partial_since if self._partial_since is not None else now
+        self._end += nbytes
+
+        view, end, pos = self._view, self._end, 0
+        while end - pos >= HEADER.size:
+            channel, command, length = HEADER.unpack_from(self._buffer, pos)
+            body = pos + HEADER.size
+            if end - body < length:
+                break
+            self.server.handler(self, channel, command, view[body:body + length])
+            finished = time.perf_counter()
+            self.stats.add_frame(HEADER.size + length, finished - start)
+            start = now
+            pos = body + length
+
+        if pos:
+            # move the start of the next message to the front of the buffer,
+            # through a copy, since the two regions may overlap
+            self._buffer[:end - pos] = bytes(self._view[pos:end])
+            self._end = end - pos
+        self._partial_since = start if self._end else None
+
+
+def null_handler(client, channel, command, data):
+    """A handler which throws every frame away."""
+
+
+class Server(object):
+
+    def __init__(self, handler=null_handler, host='0.0.0.0', port=7890):
+        """Create an OPC server which calls handler(client, channel, command, data)
+        for every message received.
+
+        client: the ClientConnection it came from, with .peer and .stats
+        data: a memoryview of the message body, only valid during the call
+
+        The handler runs on the event loop, so it should be quick.
+
+        """
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.clients = []   # open ClientConnections
+        # ClientStats of the most recently closed connections
+        self.finished = collections.deque(maxlen=MAX_FINISHED)
+        self._server = None
+
+    async def start(self):
+        """Start listening.  Returns once the socket is bound."""
+        loop = asyncio.get_event_loop()
+        self._server = await loop.create_server(
+            lambda: ClientConnection(self), self.host, self.port)
+        if not self.port:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    def close(self):
+        """Stop listening and drop every client."""
+        if self._server is not None:
+            self._server.close()
+        for client in list(self.clients):
+            client.transport.close()
+
+    def stats(self):
+        """Return a dict of stats dicts for the open connections, by peer address."""
+        return dict(('%s:%s' % client.peer[:2], client.stats.as_dict())
+                    for client in self.clients)
+
+
+def print_stats(server):
+    for peer, stats in sorted(server.stats().items()):
+        print('    %-21s %7d frames %7.1f fps %8.2f Mbit/s  latency mean %.3fms max %.3fms'
+              % (peer, stats['frames'], stats['fps'], stats['mbps'],
+                 stats['latency_mean'] * 1e3, stats['latency_max'] * 1e3))
+
+
+async def run_sink(host, port, interval):
+    server = Server(host=host, port=port)
+    await server.start()
+    print('    listening for OPC on %s:%d (control-c to exit)...' % (server.host, server.port))
+    while True:
+        await asyncio.sleep(interval)
+        print_stats(server)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-H', '--host', dest='host', default='0.0.0.0',
+                        action='store', type='string',
+                        help='address to listen on')
+    parser.add_option('-p', '--port', dest='port', default=7890,
+                        action='store', type='int',
+                        help='port to listen on')
+    parser.add_option('-i', '--interval', dest='interval', default=5,
+                        action='store', type='float',
+                        help='seconds between printing stats')
+    options, args = parser.parse_args()
+
+    try:
+        asyncio.run(run_sink(options.host, options.port, options.interval))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,526 @@
+"""A fast OSC receiver: decoding, address matching and dispatch.
+
+pyOSC and python-osc look up every message's handler by trying each
+registered address in turn, and hand messages over one at a time.  This
+module instead compiles the registered addresses into a trie, one level
+per address part, so matching costs one dictionary lookup per part, and
+remembers the result for each address it has seen, so a repeated address
+(every fader move) costs a single lookup in all.
+
+Registered addresses may use OSC pattern matching in any part:
+
+    ?        any one character
+    *        any run of characters
+    [abc]    any of a, b or c;  [a-z] a range;  [!abc] anything else
+    {up,down}  either word
+
+and so may the addresses of incoming messages, which are matched against
+the registered literal addresses, so /LeftBlack/* sets all four LeftBlack
+controls at once.
+
+    dispatcher = osc_dispatch.Dispatcher()
+    dispatcher.map('/LeftChooser/*/*', on_chooser)   # handler(address, *args)
+    dispatcher.map_store(controls)                   # a control_store.ControlStore
+    osc_dispatch.serve_forever(dispatcher, ('0.0.0.0', 5006))
+
+or, in the same asyncio event loop as the renderer, so a control change
+costs a few microseconds of the loop's time and an idle server costs
+nothing:
+
+    transport = await osc_dispatch.serve(dispatcher, ('0.0.0.0', 5006))
+
+serve_forever() receives each datagram into one reused buffer.  Either
+way a datagram is decoded straight from the bytes it arrived in.  All
+the messages in a datagram, including every message of a bundle, are
+decoded before any is applied, and those for a ControlStore are written
+to it as one change, so the renderer sees a whole bundle or none of it.
+
+A scheduled dispatcher holds back bundles whose timetag is in the future,
+in a heap ordered by time, and the render loop applies them on the frame
+whose time they fall in:
+
+    dispatcher = osc_dispatch.Dispatcher(scheduled=True)
+    ...
+    while True:
+        t = clock.tick()
+        dispatcher.apply_due(clock.next_deadline)
+        controls = store.snapshot_dict()
+
+so a cue sent ahead of time lands on its frame however the network
+delayed it.  Bundles which arrive after their time, and plain messages,
+are applied as soon as they arrive.
+
+"""
+
+from __future__ import division
+import asyncio
+import heapq
+import itertools
+import re
+import socket
+import struct
+import threading
+import time
+
+# OSC timetag meaning "immediately"
+IMMEDIATELY = 1
+
+# seconds from the NTP epoch, 1900, which timetags count from, to 1970
+NTP_EPOCH_OFFSET = 2208988800
+
+_BUNDLE = b'#bundle\x00'
+_INT32 = struct.Struct('>i')
+_TIMETAG = struct.Struct('>Q')
+_PATTERN_CHARS = re.compile(r'[*?\[\]{}]')
+
+# fixed-size argument types: struct format and size
+_FIXED = {'i': ('i', 4), 'f': ('f', 4), 'h': ('q', 8), 'd': ('d', 8),
+          't': ('Q', 8), 'r': ('I', 4), 'c': ('I', 4)}
+_NO_DATA = {'T': True, 'F': False, 'N': None, 'I': float('inf')}
+
+
+class OSCDecodeError(ValueError):
+    """A datagram which isn't valid OSC."""
+
+
+#-------------------------------------------------------------------------------
+# decoding
+
+def _read_string(buffer, pos, end):
+    """Return (the null-terminated string at pos, the position after its padding)."""
+    nul = buffer.find(b'\x00', pos, end)
+    if nul < 0:
+        raise OSCDecodeError('unterminated string at %d' % pos)
+    return bytes(buffer[pos:nul]).decode('utf-8', 'replace'), (nul + 4) & ~3
+
+
+# type tag string -> Struct for messages whose arguments are all fixed-size
+_structs = {}
+
+
+def _read_arguments(buffer, pos, end, tags):
+    if tags not in _structs:
+        if all(tag in _FIXED for tag in tags):
+            _structs[tags] = struct.Struct('>' + ''.join(_FIXED[tag][0] for tag in tags))
+        else:
+            _structs[tags] = None
+    fixed = _structs[tags]
+    if fixed is not None:
+        if pos + fixed.size > end:
+            raise OSCDecodeError('message too short for its arguments')
+        args = fixed.unpack_from(buffer, pos)
+        if 'c' in tags:
+            args = tuple(chr(arg) if tag == 'c' else arg for tag, arg in zip(tags, args))
+        return args
+
+    args = []
+    for tag in tags:
+        if tag in _FIXED:
+            fmt, size = _FIXED[tag]
+            if pos + size > end:
+                raise OSCDecodeError('message too short for its arguments')
+            value = struct.unpack_from('>' + fmt, buffer, pos)[0]
+            args.append(chr(value) if tag == 'c' else value)
+            pos += size
+        elif tag in 'sS':
+            value, pos = _read_string(buffer, pos, end)
+            args.append(value)
+        elif tag == 'b':
+            if pos + 4 > end:
+                raise OSCDecodeError('message too short for its arguments')
+            size = _INT32.unpack_from(buffer, pos)[0]
+            pos += 4
+            if size < 0 or pos + size > end:
+                raise OSCDecodeError('bad blob length %d' % size)
+            args.append(bytes(buffer[pos:pos + size]))
+            pos += (size + 3) & ~3
+        elif tag == 'm':
+            if pos + 4 > end:
+                raise OSCDecodeError('message too short for its arguments')
+            args.append(tuple(buffer[pos:pos + 4]))
+            pos += 4
+        elif tag in _NO_DATA:
+            args.append(_NO_DATA[tag])
+        else:
+            raise OSCDecodeError('unsupported argument type %r' % tag)
+    return tuple(args)
+
+
+def parse(buffer, end=None, timetag=IMMEDIATELY, out=None):
+    """Decode an OSC packet into a list of (timetag, address, args).
+
+    buffer: bytes or a bytearray holding the packet, from 0 to end.  It
+        is decoded in place, without copying the packet.
+    timetag: the timetag to give plain messages, IMMEDIATELY by default.
+        Messages in a bundle get the bundle's.
+
+    Raises OSCDecodeError if the packet is malformed.
+
+    """
+    if end is None:
+        end = len(buffer)
+    if out is None:
+        out = []
+    _parse_element(buffer, 0, end, timetag, out)
+    return out
+
+
+def _parse_element(buffer, pos, end, timetag, out):
+    if buffer[pos:pos + 8] == _BUNDLE:
+        if end - pos < 16:
+            raise OSCDecodeError('bundle too short')
+        timetag = _TIMETAG.unpack_from(buffer, pos + 8)[0]
+        pos += 16
+        while pos < end:
+            if pos + 4 > end:
+                raise OSCDecodeError('truncated bundle element')
+            size = _INT32.unpack_from(buffer, pos)[0]
+            pos += 4
+            if size <= 0 or pos + size > end:
+                raise OSCDecodeError('bad bundle element length %d' % size)
+            _parse_element(buffer, pos, pos + size, timetag, out)
+            pos += size
+        return
+
+    if pos >= end or buffer[pos] != ord('/'):
+        raise OSCDecodeError('not an OSC message or bundle')
+    address, pos = _read_string(buffer, pos, end)
+    if pos >= end:
+        args = ()  # old implementations may leave out the type tags
+    else:
+        tags, pos = _read_string(buffer, pos, end)
+        if not tags.startswith(','):
+            raise OSCDecodeError('bad type tag string %r' % tags)
+        args = _read_arguments(buffer, pos, end, tags[1:])
+    out.append((timetag, address, args))
+
+
+def _pad(data):
+    return data + b'\x00' * (4 - len(data) % 4)
+
+
+def build_message(address, *args):
+    """Encode an OSC message.  Arguments may be ints, floats, strings or bytes."""
+    tags, data = [','], []
+    for arg in args:
+        if isinstance(arg, bool):
+            tags.append('T' if arg else 'F')
+        elif isinstance(arg, int):
+            tags.append('i')
+            data.append(_INT32.pack(arg))
+        elif isinstance(arg, float):
+            tags.append('f')
+            data.append(struct.pack('>f', arg))
+        elif isinstance(arg, str):
+            tags.append('s')
+            data.append(_pad(arg.encode('utf-8')))
+        elif isinstance(arg, bytes):
+            tags.append('b')
+            data.append(_INT32.pack(len(arg)) + arg + b'\x00' * (-len(arg) % 4))
+        else:
+            raise TypeError('no OSC type for %r' % (arg,))
+    return _pad(address.encode('utf-8')) + _pad(''.join(tags).encode()) + b''.join(data)
+
+
+def build_bundle(timetag, *elements):
+    """Encode an OSC bundle of already encoded messages or bundles."""
+    return _BUNDLE + _TIMETAG.pack(timetag) + b''.join(
+        _INT32.pack(len(element)) + element for element in elements)
+
+
+def timetag_to_time(timetag):
+    """Return the Unix time of an OSC timetag."""
+    return (timetag >> 32) - NTP_EPOCH_OFFSET + (timetag & 0xffffffff) / 2**32
+
+
+def time_to_timetag(t):
+    """Return the OSC timetag of Unix time t."""
+    seconds, fraction = divmod(t + NTP_EPOCH_OFFSET, 1)
+    return (int(seconds) << 32) | int(fraction * 2**32)
+
+
+#-------------------------------------------------------------------------------
+# address matching
+
+def _compile_part(part):
+    """Translate one part of an OSC address pattern to a regex."""
+    regex = []
+    ii = 0
+    while ii < len(part):
+        char = part[ii]
+        if char == '*':
+            regex.append('.*')
+        elif char == '?':
+            regex.append('.')
+        elif char == '[':
+            close = part.find(']', ii)
+            if close < 0:
+                raise ValueError('unclosed [ in %r' % part)
+            body = part[ii + 1:close]
+            negate = body.startswith('!')
+            if negate:
+                body = body[1:]
+            body = ''.join('\\' + c if c in '\\^]' else c for c in body)
+            regex.append('[%s%s]' % ('^' if negate else '', body))
+            ii = close
+        elif char == '{':
+            close = part.find('}', ii)
+            if close < 0:
+                raise ValueError('unclosed { in %r' % part)
+            words = part[ii + 1:close].split(',')
+            regex.append('(?:%s)' % '|'.join(re.escape(w) for w in words))
+            ii = close
+        else:
+            regex.append(re.escape(char))
+        ii += 1
+    return re.compile(''.join(regex) + r'\Z')
+
+
+class _Node(object):
+
+    def __init__(self):
+        self.children = {}   # literal part -> _Node
+        self.patterns = []   # (source, compiled regex, _Node)
+        self.handlers = []
+
+    def child(self, part):
+        if _PATTERN_CHARS.search(part):
+            for source, regex, node in self.patterns:
+                if source == part:
+                    return node
+            node = _Node()
+            self.patterns.append((part, _compile_part(part), node))
+            return node
+        return self.children.setdefault(part, _Node())
+
+
+class _StoreTarget(object):
+    """Marks an address as belonging to a ControlStore."""
+
+    def __init__(self, store):
+        self.store = store
+
+
+class Dispatcher(object):
+
+    def __init__(self, cache_size=4096, scheduled=False, now=time.monotonic, wall=time.time):
+        """Create a dispatcher with no handlers.
+
+        scheduled: hold back bundles timed for the future until apply_due().
+        now: the clock apply_due() deadlines are on, that of the FrameClock.
+        wall: the clock timetags are on, Unix time.
+
+        """
+        self._root = _Node()
+        self._cache = {}  # address -> tuple of handlers
+        self._cache_size = cache_size
+        self._default = None
+
+        self.scheduled = scheduled
+        self._now = now
+        self._wall = wall
+        self._pending = []  # heap of (due, arrival order, address, args)
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self.late = 0       # bundles which arrived after their time
+
+    def map(self, pattern, handler):
+        """Call handler(address, *args) for messages matching pattern."""
+        node = self._root
+        for part in pattern.split('/')[1:]:
+            node = node.child(part)
+        node.handlers.append(handler)
+        self._cache.clear()
+
+    def map_store(self, store, addresses=None):
+        """Write messages for the store's addresses, or the given ones, into it."""
+        target = _StoreTarget(store)
+        for address in (store.addresses if addresses is None else addresses):
+            self.map(address, target)
+
+    def set_default_handler(self, handler):
+        """Call handler(address, *args) for messages nothing else matches."""
+        self._default = handler
+        self._cache.clear()
+
+    def handlers_for(self, address):
+        """Return the handlers for an incoming address, which may be a pattern."""
+        handlers = self._cache.get(address)
+        if handlers is None:
+            found = []
+            self._match(self._root, address.split('/')[1:], 0, found)
+            if not found and self._default is not None:
+                found.append(self._default)
+            handlers = tuple(found)
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[address] = handlers
+        return handlers
+
+    def _match(self, node, parts, depth, found):
+        if depth == len(parts):
+            for handler in node.handlers:
+                if handler not in found:
+                    found.append(handler)
+            return
+        part = parts[depth]
+        if _PATTERN_CHARS.search(part):
+            # an incoming pattern: try it against every literal part here
+            regex = _compile_part(part)
+            for literal, child in node.children.items():
+                if regex.match(literal):
+                    self._match(child, parts, depth + 1, found)
+        else:
+            child = node.children.get(part)
+            if child is not None:
+                self._match(child, parts, depth + 1, found)
+            for source, regex, child in node.patterns:
+                if regex.match(part):
+                    self._match(child, parts, depth + 1, found)
+
+    def addresses_for(self, pattern):
+        """Return the registered literal addresses an incoming pattern matches."""
+        addresses = []
+        self._collect(self._root, pattern.split('/')[1:], 0, '', addresses)
+        return addresses
+
+    def _collect(self, node, parts, depth, prefix, addresses):
+        if depth == len(parts):
+            if node.handlers:
+                addresses.append(prefix)
+            return
+        regex = _compile_part(parts[depth])
+        for literal, child in node.children.items():
+            if regex.match(literal):
+                self._collect(child, parts, depth + 1, prefix + '/' + literal, addresses)
+
+    def dispatch(self, messages):
+        """Apply a list of (timetag, address, args), as returned by parse().
+
+        Store writes are gathered and made as one change per store, after
+        the other handlers have been called.  A scheduled dispatcher queues
+        the messages timed for the future instead.
+
+        """
+        if self.scheduled:
+            messages = self._schedule(messages)
+        self._apply(messages)
+
+    def _schedule(self, messages):
+        """Queue the future messages and return the rest."""
+        now = self._now()
+        offset = self._wall() - now  # from now's clock to Unix time
+        immediate = []
+        late_tag = None
+        with self._lock:
+            for message in messages:
+                timetag = message[0]
+                if timetag != IMMEDIATELY:
+                    due = timetag_to_time(timetag) - offset
+                    if due > now:
+                        heapq.heappush(self._pending,
+                                       (due, next(self._order), message[1], message[2]))
+                        continue
+                    if timetag != late_tag:
+                        late_tag = timetag
+                        self.late += 1
+                immediate.append(message)
+        return immediate
+
+    def apply_due(self, deadline):
+        """Apply the queued messages due before deadline, on the now clock.
+
+        Call once a frame with the clock's next_deadline, so everything
+        timed to fall within the frame is applied before it renders.
+        Returns the number of messages applied.
+
+        """
+        due = []
+        with self._lock:
+            pending = self._pending
+            while pending and pending[0][0] < deadline:
+                when, order, address, args = heapq.heappop(pending)
+                due.append((when, address, args))
+        if due:
+            self._apply(due)
+        return len(due)
+
+    @property
+    def pending(self):
+        """The number of messages waiting for their time."""
+        return len(self._pending)
+
+    def _apply(self, messages):
+        stores = {}
+        for timetag, address, args in messages:
+            for handler in self.handlers_for(address):
+                if isinstance(handler, _StoreTarget):
+                    batch = stores.setdefault(handler.store, [])
+                    if _PATTERN_CHARS.search(address):
+                        batch.extend((a, args) for a in self.addresses_for(address)
+                                     if a in handler.store)
+                    else:
+                        batch.append((address, args))
+                else:
+                    handler(address, *args)
+        for store, batch in stores.items():
+            store.set_many(batch)
+
+    def handle(self, buffer, end=None):
+        """Decode a datagram and apply all of its messages."""
+        self.dispatch(parse(buffer, end))
+
+
+#-------------------------------------------------------------------------------
+# receiving
+
+def serve_forever(dispatcher, address, buffer_size=65536, verbose=False):
+    """Receive OSC datagrams on address, (ip, port), and dispatch them.  Never returns.
+
+    A datagram which can't be decoded, or whose handler raises, is
+    skipped, so one bad message never stops the server.
+
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(address)
+    buffer = bytearray(buffer_size)
+    while True:
+        n_bytes = sock.recv_into(buffer)
+        try:
+            dispatcher.handle(buffer, n_bytes)
+        except OSCDecodeError as e:
+            if verbose:
+                print('    ignoring bad OSC datagram: %s' % e)
+        except Exception as e:
+            print('    error handling OSC datagram: %s: %s' % (type(e).__name__, e))
+
+
+class OSCProtocol(asyncio.DatagramProtocol):
+    """Dispatches each datagram received on an asyncio endpoint."""
+
+    def __init__(self, dispatcher, verbose=False):
+        self.dispatcher = dispatcher
+        self.verbose = verbose
+        self.errors = 0
+
+    def datagram_received(self, data, addr):
+        try:
+            self.dispatcher.handle(data)
+        except OSCDecodeError as e:
+            self.errors += 1
+            if self.verbose:
+                print('    ignoring bad OSC datagram from %s: %s' % (addr[0], e))
+        except Exception as e:
+            # raised out of here, it would close the transport
+            self.errors += 1
+            print('    error handling OSC datagram from %s: %s: %s'
+                  % (addr[0], type(e).__name__, e))
+
+
+async def serve(dispatcher, address, verbose=False):
+    """Receive OSC datagrams on address, (ip, port), in the running event
+    loop, and dispatch them.  Returns the transport; close it to stop."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: OSCProtocol(dispatcher, verbose), local_addr=address)
+    return transport
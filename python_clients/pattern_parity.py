@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Check each pattern's vectorized render() against its per-pixel reference.
+
+Renders a few frames of every pattern in render_routines both ways on the
+same layout and reports the largest difference in any color channel.
+
+Usage:
+
+    python_clients/pattern_parity.py --layout layouts/spiral_3250_pts.json
+
+Exits with status 1 if any pattern differs by more than the tolerance.
+
+"""
+
+from __future__ import division
+import optparse
+import os
+import sys
+
+import numpy as np
+
+import layout_cache
+from render_routines import lava_lamp, miami, nyan_cat, sailor_moon, spatial_stripes
+
+# (name, module, init_state keyword arguments)
+PATTERNS = [
+    ('lava_lamp', lava_lamp, {}),
+    ('miami', miami, {}),
+    ('miami_sparkle', miami, dict(twinkle_speed=miami.MiamiSparkle.twinkle_speed,
+                                  twinkle_density=miami.MiamiSparkle.twinkle_density)),
+    ('nyan_cat', nyan_cat, {}),
+    ('sailor_moon', sailor_moon, {}),
+    ('spatial_stripes', spatial_stripes, {}),
+    ]
+TIMES = [0, 0.37, 12.5, 101.2]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LAYOUT = os.path.join(HERE, '..', 'layouts', 'wall.json')
+
+
+def max_difference(pattern, coords, t, params):
+    """Return the largest channel difference between render and render_reference."""
+    state = pattern.init_state(coords, **params)
+    expected = pattern.render_reference(t, coords, state)
+    actual = pattern.render(t, coords, state)
+    return np.abs(actual - expected).max()
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-l', '--layout', dest='layout', default=DEFAULT_LAYOUT,
+                        action='store', type='string',
+                        help='layout file')
+    parser.add_option('-t', '--tolerance', dest='tolerance', default=1e-6,
+                        action='store', type='float',
+                        help='largest allowed difference, in 0-255 color units')
+    options, args = parser.parse_args()
+
+    coords = layout_cache.load_layout(options.layout).astype(float)
+
+    failed = False
+    for name, pattern, params in PATTERNS:
+        diff = max(max_difference(pattern, coords, t, params) for t in TIMES)
+        ok = diff <= options.tolerance
+        failed = failed or not ok
+        print('%-16s %-4s max difference %.3g' % (name, 'ok' if ok else 'FAIL', diff))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,38 +28,7 @@ import color_utils
 
 
 #-------------------------------------------------------------------------------
-# handle command line
-
-if len(sys.argv) == 1:
-    IP_PORT = '127.0.0.1:7890'
-elif len(sys.argv) == 2 and ':' in sys.argv[1] and not sys.argv[1].startswith('-'):
-    IP_PORT = sys.argv[1]
-else:
-    print
-    print '    Usage: raver_plaid.py [ip:port]'
-    print
-    print '    If not set, ip:port defauls to 127.0.0.1:7890'
-    print
-    sys.exit(0)
-
-
-#-------------------------------------------------------------------------------
-# connect to server
-
-client = opc.Client(IP_PORT)
-if client.can_connect():
-    print '    connected to %s' % IP_PORT
-else:
-    # can't connect, but keep running in case the server appears later
-    print '    WARNING: could not connect to %s' % IP_PORT
-print
-
-
-#-------------------------------------------------------------------------------
-# send pixels
-
-print '    sending pixels forever (control-c to exit)...'
-print
+# color function
 
 n_pixels = 512   # number of pixels in the included "wall" layout
 fps = 24         # frames per second
@@ -75,9 +44,8 @@ speed_r = -2.7
 speed_g =  2.3
 speed_b = -2.9
 
-start_time = time.time()
-while True:
-    t = time.time() - start_time
+def render_pixels(n_pixels, t):
+    """Return a list of n_pixels (r, g, b) tuples for t seconds since the start."""
     pixels = []
     for ii in range(n_pixels):
         pct = ii / n_pixels
@@ -110,6 +78,48 @@ while True:
                 math.cos((t/speed_b + pct*freq_b)*math.pi*2),
                 -1, 1, 0, 256)
         pixels.append((r, g, b))
-    client.put_pixels(pixels, channel=0)
-    time.sleep(1 / fps)
-
+    return pixels
+
+
+def main():
+    #-------------------------------------------------------------------------------
+    # handle command line
+
+    if len(sys.argv) == 1:
+        IP_PORT = '127.0.0.1:7890'
+    elif len(sys.argv) == 2 and ':' in sys.argv[1] and not sys.argv[1].startswith('-'):
+        IP_PORT = sys.argv[1]
+    else:
+        print()
+        print('    Usage: raver_plaid.py [ip:port]')
+        print()
+        print('    If not set, ip:port defauls to 127.0.0.1:7890')
+        print()
+        sys.exit(0)
+
+    #-------------------------------------------------------------------------------
+    # connect to server
+
+    client = opc.Client(IP_PORT)
+    if client.can_connect():
+        print('    connected to %s' % IP_PORT)
+    else:
+        # can't connect, but keep running in case the server appears later
+        print('    WARNING: could not connect to %s' % IP_PORT)
+    print()
+
+    #-------------------------------------------------------------------------------
+    # send pixels
+
+    print('    sending pixels forever (control-c to exit)...')
+    print()
+
+    start_time = time.time()
+    while True:
+        t = time.time() - start_time
+        client.put_pixels(render_pixels(n_pixels, t), channel=0)
+        time.sleep(1 / fps)
+
+
+if __name__ == '__main__':
+    main()
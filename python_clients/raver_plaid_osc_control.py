@@ -20,40 +20,33 @@ Then run this script in another shell to send colors to the simulator
 
 from __future__ import division
 import argparse
-import time
+import asyncio
 import math
 import sys
-import threading
-
-from queue import Queue
 
 import opc
 import color_utils
-
-from pythonosc import dispatcher
-from pythonosc import osc_server
+import control_store
+import frame_clock
+import osc_dispatch
 
 #-------------------------------------------------------------------------------
 # Process command line args
 
 parser = argparse.ArgumentParser(description='An OSC server which sends RGB values to an OPC server')
 parser.add_argument('--listen_ip', default='0.0.0.0', help='')
-parser.add_argument('--listen_port', default=5006, help='')
+parser.add_argument('--listen_port', default=5006, type=int, help='')
 parser.add_argument('--send_ip', default='0.0.0.0', help='')
 parser.add_argument('--send_port', default='7890', help='')
-parser.add_argument('--pixel_count', default=512, help='')
-parser.add_argument('--fps', default=24, help='')
+parser.add_argument('--pixel_count', default=512, type=int, help='')
+parser.add_argument('--fps', default=24, type=int, help='')
 args = parser.parse_args()
 
 #-------------------------------------------------------------------------------
 # Connect to OPC server
 OPC_IP_PORT = "%s:%s" % (args.send_ip, args.send_port)
-client = opc.Client(OPC_IP_PORT)
-if client.can_connect():
-    print('connected to %s' % OPC_IP_PORT)
-else:
-    # can't connect, but keep running in case the server appears later
-    print('WARNING: could not connect to %s' % IP_PORT)
+# connected from the event loop; it keeps retrying if the server isn't up
+client = opc.AsyncClient(OPC_IP_PORT)
 
 #-------------------------------------------------------------------------------
 # Number of Pixels, and Frame rate
@@ -70,31 +63,41 @@ speed_g =  2.3
 speed_b = -0.9
 
 #------------------------------------------------------------------------------
-# initialize the queues
-queue_r = Queue()
-queue_g = Queue()
-queue_b = Queue()
-
-queue_r.put(("/1/red", speed_r, freq_r))
-queue_g.put(("/1/green", speed_g, freq_g))
-queue_b.put(("/1/blue", speed_b, freq_b))
+# the latest speed and frequency of each color, written as OSC arrives and
+# read once a frame by the renderer
+controls = control_store.ControlStore({
+    "/1/red":   (speed_r, freq_r),
+    "/1/green": (speed_g, freq_g),
+    "/1/blue":  (speed_b, freq_b),
+    })
 
 #------------------------------------------------------------------------------
 # The TouchOSC server
-dispatcher = dispatcher.Dispatcher()
+# bundles timed for the future are held back until their frame
+dispatcher = osc_dispatch.Dispatcher(scheduled=True)
 # Mappings for the controls
 # controls consist of THREE x/y boxes in a TouchOSC interface
-dispatcher.map("/1/red",   queue_r.put)
-dispatcher.map("/1/green", queue_g.put)
-dispatcher.map("/1/blue",  queue_b.put)
-
-server = osc_server.ForkingOSCUDPServer((args.listen_ip, args.listen_port), dispatcher)
-server_thread = threading.Thread(target=server.serve_forever)
-
-def render_pixels(queue_r, queue_g, queue_b):
-    start_time = time.time()
+dispatcher.map_store(controls, ["/1/red", "/1/green", "/1/blue"])
+
+async def render_pixels(controls):
+    # OSC is received in the same event loop, while the clock waits
+    await osc_dispatch.serve(dispatcher, (args.listen_ip, args.listen_port))
+    if await client.connect():
+        print('connected to %s' % OPC_IP_PORT)
+    else:
+        # can't connect, but keep running in case the server appears later
+        print('WARNING: could not connect to %s' % OPC_IP_PORT)
+
+    clock = frame_clock.FrameClock(fps, mode=frame_clock.WALL)
     while True:
-        t = time.time() - start_time
+        t = await clock.tick_async()
+
+        # the latest values, read once a frame
+        dispatcher.apply_due(clock.next_deadline)
+        latest = controls.snapshot_dict()
+        speed_r, freq_r = latest["/1/red"]
+        speed_g, freq_g = latest["/1/green"]
+        speed_b, freq_b = latest["/1/blue"]
 
         pixels = []
         for ii in range(n_pixels):
@@ -116,14 +119,6 @@ def render_pixels(queue_r, queue_g, queue_b):
             blackstripes = color_utils.clamp(
                     blackstripes + blackstripes_offset, 0, 1)
             # 3 sine waves for r, g, b which are out of sync with each other
-            r_name, speed_r, freq_r = queue_r.get()
-            g_name, speed_g, freq_g = queue_g.get()
-            b_name, speed_b, freq_b = queue_b.get()
-
-            print(("%.2f" %t, speed_r, freq_r))
-            print(("%.2f" %t, speed_g, freq_g))
-            print(("%.2f" %t, speed_b, freq_b))
-
             r = blackstripes * color_utils.remap(
                     math.cos((
                         t/speed_r + pct*freq_r)*math.pi*2),
@@ -136,18 +131,15 @@ def render_pixels(queue_r, queue_g, queue_b):
                     math.cos((t/speed_b + pct*freq_b)*math.pi*2),
                     -1, 1, 0, 256)
             pixels.append((r, g, b))
-        client.put_pixels(pixels, channel=0)
-        time.sleep(1 / fps)
+        await client.put_pixels(pixels, channel=0)
 
 
-print("Listening for OSC on {}".format(server.server_address))
-print("Serving to OPC on {}".format(server.server_address))
+print("Listening for OSC on {}".format("%s:%d" % (args.listen_ip, args.listen_port)))
+print("Serving to OPC on {}".format(OPC_IP_PORT))
 print('control-c to exit...')
-server_thread.start()
-render_thread = threading.Thread(target=render_pixels, args=(queue_r, queue_g, queue_b))
-render_thread.start()
-
-server_thread.join()
-render_thread.join()
-
-server.shutdown()
+try:
+    asyncio.run(render_pixels(controls))
+except KeyboardInterrupt:
+    sys.exit(0)
+finally:
+    controls.close()
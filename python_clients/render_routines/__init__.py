@@ -0,0 +1,70 @@
+"""A library of patterns for Open Pixel Control
+http://github.com/zestyping/openpixelcontrol
+
+Each pattern is a class with two methods:
+
+    setup(layout)   called once with an (N, 3) array of pixel positions
+    render(t)       returns an (N, 3) array of colors in the range 0-255
+                    for t seconds since the show started
+
+t is a beat_clock.Time: a float of seconds which also carries the musical
+position, t.beats, t.bar, t.phase and t.bpm, from the show's tempo clock,
+so patterns can lock to the music.  Patterns take all their time from t
+and never read the system clock.
+
+Patterns register themselves by name, so they can be looked up, swapped
+and composed without importing each module by hand:
+
+    import render_routines
+
+    pattern = render_routines.get_pattern('lava_lamp')()
+    pattern.setup(coords)
+    client.put_pixels(pattern.render(t), channel=0)
+
+To run a pattern against an OPC server use python_clients/run_pattern.py.
+
+"""
+
+PATTERNS = {}
+
+
+def register(cls):
+    """Class decorator which adds a Pattern subclass to PATTERNS by its name."""
+    if cls.name in PATTERNS:
+        raise ValueError('pattern %r is already registered' % cls.name)
+    PATTERNS[cls.name] = cls
+    return cls
+
+
+def get_pattern(name):
+    """Return the Pattern subclass registered as name."""
+    try:
+        return PATTERNS[name]
+    except KeyError:
+        raise KeyError('unknown pattern %r, choose from: %s'
+                       % (name, ', '.join(sorted(PATTERNS))))
+
+
+class Pattern(object):
+    """Base class for patterns.
+
+    Subclasses set name, and override render() and usually setup().
+
+    """
+
+    name = None
+
+    def setup(self, layout):
+        """Prepare to render onto layout, an (N, 3) array of pixel positions."""
+        self.coords = layout
+
+    def render(self, t):
+        """Return an (N, 3) array of colors for time t, in the range 0-255.
+
+        The array may be reused by the next call to render().
+
+        """
+        raise NotImplementedError
+
+
+from render_routines import conway, lava_lamp, miami, nyan_cat, sailor_moon, spatial_stripes
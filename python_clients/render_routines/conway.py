@@ -4,26 +4,16 @@ A demo client for Open Pixel Control
 David Wallace / https://github.com/longears
 
 game of life
+
+    python_clients/run_pattern.py conway --layout layouts/wall.json
 """
 
 from __future__ import division
-import time
-import os
-import sys
-import optparse
 import random
 
-import opc
+import numpy as np
 
-# command line
-parser = optparse.OptionParser()
-parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
-                    action='store', type='string',
-                    help='ip and port of server')
-parser.add_option('-f', '--fps', dest='fps', default=5,
-                    action='store', type='int',
-                    help='frames per second')
-options, args = parser.parse_args()
+from render_routines import Pattern, register
 
 X_DIM = 25
 Y_DIM = 25
@@ -32,10 +22,10 @@ def print_board(board):
     for x in range(X_DIM):
         for y in range(Y_DIM):
             if board[x*X_DIM+y]==1:
-                print 'X',
+                print('X', end=' ')
             else:
-                print '.',
-        print
+                print('.', end=' ')
+        print()
 
 def rand_board():
     board = ['0'] * X_DIM * Y_DIM
@@ -77,17 +67,33 @@ def pixelify_board(board):
 def pixelify_triboard(r,g,b):
     pixels = []
     for rcell, gcell, bcell in zip(r,g,b):
-        print rcell,gcell,bcell
+        print(rcell,gcell,bcell)
         color = (130 if rcell else 0, 130 if gcell else 0, 130 if bcell else 0)
         pixels.append(color)
     return pixels
 
-board = rand_board()
 
+#-------------------------------------------------------------------------------
+# pattern
+
+@register
+class Conway(Pattern):
+    """Game of life on a 25x25 board, drawn onto the first pixels of the layout."""
+
+    name = 'conway'
+    generations_per_second = 5
 
-client = opc.Client(options.server)
-while True:
-    client.put_pixels(pixelify_board(board), channel=0)
-    board = tick(board)
-    time.sleep(1 / options.fps)
+    def setup(self, layout):
+        self.coords = layout
+        self.board = rand_board()
+        self.generation = 0
+        self.pixels = np.zeros((len(layout), 3))
 
+    def render(self, t):
+        generation = int(t * self.generations_per_second)
+        if generation != self.generation:
+            self.board = tick(self.board)
+            self.generation = generation
+        n_cells = min(len(self.pixels), len(self.board))
+        self.pixels[:n_cells] = pixelify_board(self.board)[:n_cells]
+        return self.pixels
@@ -11,79 +11,25 @@ First start the gl simulator using, for example, the included "wall" layout
     make
     bin/gl_server layouts/wall.json
 
-Then run this script in another shell to send colors to the simulator
+Then run this pattern in another shell to send colors to the simulator
 
-    python_clients/miami.py --layout layouts/wall.json
+    python_clients/run_pattern.py miami --layout layouts/wall.json
 
 """
 
 from __future__ import division
-import time
-import sys
-import optparse
-import random
-try:
-    import json
-except ImportError:
-    import simplejson as json
-
-import opc 
-import color_utils
-
-
-#-------------------------------------------------------------------------------
-# command line
 
-parser = optparse.OptionParser()
-parser.add_option('-l', '--layout', dest='layout',
-                    action='store', type='string',
-                    help='layout file')
-parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
-                    action='store', type='string',
-                    help='ip and port of server')
-parser.add_option('-f', '--fps', dest='fps', default=20,
-                    action='store', type='int',
-                    help='frames per second')
+import numpy as np
 
-options, args = parser.parse_args()
-
-if not options.layout:
-    parser.print_help()
-    print
-    print 'ERROR: you must specify a layout file using --layout'
-    print
-    sys.exit(1)
-
-
-#-------------------------------------------------------------------------------
-# parse layout file
-
-print
-print '    parsing layout file'
-print
-
-coordinates = []
-for item in json.load(open(options.layout)):
-    if 'point' in item:
-        coordinates.append(tuple(item['point']))
-
-
-#-------------------------------------------------------------------------------
-# connect to server
-
-client = opc.Client(options.server)
-if client.can_connect():
-    print '    connected to %s' % options.server
-else:
-    # can't connect, but keep running in case the server appears later
-    print '    WARNING: could not connect to %s' % options.server
-print
+import color_utils
+import color_utils_np
+from render_routines import Pattern, register
 
 
 #-------------------------------------------------------------------------------
 # color function
 
-def pixel_color(t, coord, ii, n_pixels, random_values):
+def pixel_color(t, coord, ii, n_pixels, random_values, twinkle_speed=0.07, twinkle_density=0.1):
     """Compute the color of a given pixel.
 
     t: time in seconds since the program started.
@@ -91,6 +37,7 @@ def pixel_color(t, coord, ii, n_pixels, random_values):
     coord: the (x, y, z) position of the pixel as a tuple
     n_pixels: the total number of pixels
     random_values: a list containing a constant random value for each pixel
+    twinkle_speed, twinkle_density: how fast and how many LEDs twinkle
 
     Returns an (r, g, b) tuple in the range 0-255
 
@@ -157,9 +104,7 @@ def pixel_color(t, coord, ii, n_pixels, random_values):
     b *= fade
 
     # twinkle occasional LEDs
-    twinkle_speed = 0.07
-    twinkle_density = 0.1
-    twinkle = (random_values[ii]*7 + time.time()*twinkle_speed) % 1
+    twinkle = (random_values[ii]*7 + t*twinkle_speed) % 1
     twinkle = abs(twinkle*2 - 1)
     twinkle = color_utils.remap(twinkle, 0, 1, -1/twinkle_density, 1.1)
     twinkle = color_utils.clamp(twinkle, -0.5, 1.1)
@@ -178,17 +123,129 @@ def pixel_color(t, coord, ii, n_pixels, random_values):
 
 
 #-------------------------------------------------------------------------------
-# send pixels
+# frame function
+
+def init_state(coords, twinkle_speed=0.07, twinkle_density=0.1):
+    """Precompute the per-pixel values that render() needs for a layout.
+
+    coords: an (N, 3) array of pixel positions
+    twinkle_speed, twinkle_density: how fast and how many LEDs twinkle
+
+    Returns a dict to pass back in to every render() call.
+
+    """
+    n_pixels = len(coords)
+    return {
+        'n_pixels': n_pixels,
+        'twinkle_speed': twinkle_speed,
+        'twinkle_density': twinkle_density,
+        'random_values': np.random.random(n_pixels),
+        'pct': np.arange(n_pixels) / n_pixels,
+        'rgb': np.empty((n_pixels, 3)),
+    }
+
+def render_reference(t, coords, state):
+    """Compute a frame one pixel at a time with pixel_color.
+
+    This is the original implementation, kept as a reference for render().
+
+    """
+    n_pixels = state['n_pixels']
+    random_values = state['random_values']
+    return np.array([pixel_color(t, tuple(coord), ii, n_pixels, random_values,
+                                 state['twinkle_speed'], state['twinkle_density'])
+                     for ii, coord in enumerate(coords)])
+
+def render(t, coords, state):
+    """Compute the colors of every pixel at once.
+
+    t: time in seconds since the program started.
+    coords: an (N, 3) array of pixel positions
+    state: the dict returned by init_state(coords)
+
+    Returns an (N, 3) array of colors in the range 0-255.  The array is
+    reused by the next call.
+
+    """
+    # make moving stripes for x, y, and z
+    x, y, z = coords.T
+    y = y + color_utils_np.cos(x + 0.2*z, offset=0, period=1, minn=0, maxx=0.6)
+    z = z + color_utils_np.cos(x, offset=0, period=1, minn=0, maxx=0.3)
+    x = x + color_utils_np.cos(y + z, offset=0, period=1.5, minn=0, maxx=0.2)
+
+    # rotate
+    x, y, z = y, z, x
+
+    # make x, y, z -> r, g, b sine waves
+    rgb = state['rgb']
+    r, g, b = rgb.T
+    color_utils_np.cos(x, offset=t / 4, period=2.5, minn=0, maxx=1, out=r)
+    color_utils_np.cos(y, offset=t / 4, period=2.5, minn=0, maxx=1, out=g)
+    color_utils_np.cos(z, offset=t / 4, period=2.5, minn=0, maxx=1, out=b)
+    color_utils_np.contrast(rgb, 0.5, 1.4, out=rgb)
+
+    clampdown = rgb.sum(axis=1)/2
+    color_utils_np.remap(clampdown, 0.4, 0.5, 0, 1, out=clampdown)
+    color_utils_np.clamp(clampdown, 0, 1, out=clampdown)
+    clampdown *= 0.9
+    rgb *= clampdown[:, np.newaxis]
+
+    # black out regions
+    r2 = color_utils_np.cos(x, offset=t / 10 + 12.345, period=4, minn=0, maxx=1)
+    g2 = color_utils_np.cos(y, offset=t / 10 + 24.536, period=4, minn=0, maxx=1)
+    b2 = color_utils_np.cos(z, offset=t / 10 + 34.675, period=4, minn=0, maxx=1)
+    clampdown = (r2 + g2 + b2)/2
+    color_utils_np.remap(clampdown, 0.2, 0.3, 0, 1, out=clampdown)
+    color_utils_np.clamp(clampdown, 0, 1, out=clampdown)
+    rgb *= clampdown[:, np.newaxis]
+
+    # color scheme: fade towards blue-and-orange
+    g *= 0.6
+    g += ((r+b) / 2) * 0.4
+
+    # fade behind twinkle
+    wave = color_utils_np.cos(t - state['pct'], offset=0, period=7, minn=0, maxx=1) ** 20
+    rgb *= (1 - wave*0.2)[:, np.newaxis]
+
+    # twinkle occasional LEDs
+    twinkle_speed = state['twinkle_speed']
+    twinkle_density = state['twinkle_density']
+    twinkle = (state['random_values']*7 + t*twinkle_speed) % 1
+    twinkle = abs(twinkle*2 - 1)
+    color_utils_np.remap(twinkle, 0, 1, -1/twinkle_density, 1.1, out=twinkle)
+    color_utils_np.clamp(twinkle, -0.5, 1.1, out=twinkle)
+    twinkle **= 5
+    twinkle *= wave
+    color_utils_np.clamp(twinkle, -0.3, 1, out=twinkle)
+    rgb += twinkle[:, np.newaxis]
+
+    rgb *= 256
+    return rgb
+
+
+#-------------------------------------------------------------------------------
+# pattern
+
+@register
+class Miami(Pattern):
+    """Moving blobby colors with sparkles on top."""
+
+    name = 'miami'
+    twinkle_speed = 0.07
+    twinkle_density = 0.1
+
+    def setup(self, layout):
+        self.coords = layout
+        self.state = init_state(layout, self.twinkle_speed, self.twinkle_density)
+
+    def render(self, t):
+        return render(t*0.6, self.coords, self.state)
 
-print '    sending pixels forever (control-c to exit)...'
-print
 
-n_pixels = len(coordinates)
-random_values = [random.random() for ii in range(n_pixels)]
-start_time = time.time()
-while True:
-    t = time.time() - start_time
-    pixels = [pixel_color(t*0.6, coord, ii, n_pixels, random_values) for ii, coord in enumerate(coordinates)]
-    client.put_pixels(pixels, channel=0)
-    time.sleep(1 / options.fps)
+@register
+class MiamiSparkle(Miami):
+    """Miami with faster, denser twinkles."""
 
+    name = 'miami_sparkle'
+    twinkle_speed = 0.7
+    twinkle_density = 0.3
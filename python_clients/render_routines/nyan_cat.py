@@ -11,73 +11,19 @@ First start the gl simulator using, for example, the included "wall" layout
     make
     bin/gl_server layouts/wall.json
 
-Then run this script in another shell to send colors to the simulator
+Then run this pattern in another shell to send colors to the simulator
 
-    python_clients/nyan_cat.py --layout layouts/wall.json
+    python_clients/run_pattern.py nyan_cat --layout layouts/wall.json
 
 """
 
 from __future__ import division
-import time
-import sys
-import optparse
-import random
-try:
-    import json
-except ImportError:
-    import simplejson as json
-
-import opc 
-import color_utils
-
-
-#-------------------------------------------------------------------------------
-# command line
-
-parser = optparse.OptionParser()
-parser.add_option('-l', '--layout', dest='layout',
-                    action='store', type='string',
-                    help='layout file')
-parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
-                    action='store', type='string',
-                    help='ip and port of server')
-parser.add_option('-f', '--fps', dest='fps', default=20,
-                    action='store', type='int',
-                    help='frames per second')
-
-options, args = parser.parse_args()
-
-if not options.layout:
-    parser.print_help()
-    print
-    print 'ERROR: you must specify a layout file using --layout'
-    print
-    sys.exit(1)
-
-
-#-------------------------------------------------------------------------------
-# parse layout file
-
-print
-print '    parsing layout file'
-print
-
-coordinates = []
-for item in json.load(open(options.layout)):
-    if 'point' in item:
-        coordinates.append(tuple(item['point']))
-
 
-#-------------------------------------------------------------------------------
-# connect to server
+import numpy as np
 
-client = opc.Client(options.server)
-if client.can_connect():
-    print '    connected to %s' % options.server
-else:
-    # can't connect, but keep running in case the server appears later
-    print '    WARNING: could not connect to %s' % options.server
-print
+import color_utils
+import color_utils_np
+from render_routines import Pattern, register
 
 
 #-------------------------------------------------------------------------------
@@ -132,7 +78,7 @@ def pixel_color(t, coord, ii, n_pixels, random_values):
     # twinkle occasional LEDs
     twinkle_speed = 0.07
     twinkle_density = 0.1
-    twinkle = (random_values[ii]*7 + time.time()*twinkle_speed) % 1
+    twinkle = (random_values[ii]*7 + t*twinkle_speed) % 1
     twinkle = abs(twinkle*2 - 1)
     twinkle = color_utils.remap(twinkle, 0, 1, -1/twinkle_density, 1.1)
     twinkle = color_utils.clamp(twinkle, -0.5, 1.1)
@@ -151,17 +97,110 @@ def pixel_color(t, coord, ii, n_pixels, random_values):
 
 
 #-------------------------------------------------------------------------------
-# send pixels
+# frame function
+
+def init_state(coords):
+    """Precompute the per-pixel values that render() needs for a layout.
+
+    coords: an (N, 3) array of pixel positions
+
+    Returns a dict to pass back in to every render() call.
+
+    """
+    n_pixels = len(coords)
+
+    # shift some of the pixels to a new xyz location
+    ii = np.arange(n_pixels)
+    shift = np.zeros((n_pixels, 3))
+    shifted = ii % 7 == 0
+    shift[shifted, 0] = ((ii[shifted]*123)%5) / n_pixels * 32.12
+    shift[shifted, 1] = ((ii[shifted]*137)%5) / n_pixels * 22.23
+    shift[shifted, 2] = ((ii[shifted]*147)%7) / n_pixels * 44.34
+
+    return {
+        'n_pixels': n_pixels,
+        'random_values': np.random.random(n_pixels),
+        'pct': np.arange(n_pixels) / n_pixels,
+        'shift': shift,
+        'rgb': np.empty((n_pixels, 3)),
+    }
+
+def render_reference(t, coords, state):
+    """Compute a frame one pixel at a time with pixel_color.
+
+    This is the original implementation, kept as a reference for render().
+
+    """
+    n_pixels = state['n_pixels']
+    random_values = state['random_values']
+    return np.array([pixel_color(t, tuple(coord), ii, n_pixels, random_values)
+                     for ii, coord in enumerate(coords)])
+
+def render(t, coords, state):
+    """Compute the colors of every pixel at once.
+
+    t: time in seconds since the program started.
+    coords: an (N, 3) array of pixel positions
+    state: the dict returned by init_state(coords)
+
+    Returns an (N, 3) array of colors in the range 0-255.  The array is
+    reused by the next call.
+
+    """
+    # make moving stripes for x, y, and z
+    x, y, z = coords.T
+    y = y + color_utils_np.cos(x + 0.2*z, offset=0, period=1, minn=0, maxx=0.6)
+    z = z + color_utils_np.cos(x, offset=0, period=1, minn=0, maxx=0.3)
+    x = x + color_utils_np.cos(y + z, offset=0, period=1.5, minn=0, maxx=0.2)
+
+    # rotate
+    x, y, z = y, z, x
+
+    # shift some of the pixels to a new xyz location
+    dx, dy, dz = state['shift'].T
+    x, y, z = x + dx, y + dy, z + dz
+
+    # make x, y, z -> r, g, b sine waves
+    rgb = state['rgb']
+    r, g, b = rgb.T
+    color_utils_np.cos(x, offset=t / 4, period=2, minn=0, maxx=1, out=r)
+    color_utils_np.cos(y, offset=t / 4, period=2, minn=0, maxx=1, out=g)
+    color_utils_np.cos(z, offset=t / 4, period=2, minn=0, maxx=1, out=b)
+    color_utils_np.contrast(rgb, 0.5, 1.5, out=rgb)
+
+    # a moving wave across the pixels, usually dark.
+    # lines up with the wave of twinkles
+    fade = color_utils_np.cos(t - state['pct'], offset=0, period=7, minn=0, maxx=1) ** 20
+    rgb *= fade[:, np.newaxis]
+
+    # twinkle occasional LEDs
+    twinkle_speed = 0.07
+    twinkle_density = 0.1
+    twinkle = (state['random_values']*7 + t*twinkle_speed) % 1
+    twinkle = abs(twinkle*2 - 1)
+    color_utils_np.remap(twinkle, 0, 1, -1/twinkle_density, 1.1, out=twinkle)
+    color_utils_np.clamp(twinkle, -0.5, 1.1, out=twinkle)
+    twinkle **= 5
+    twinkle *= fade
+    color_utils_np.clamp(twinkle, -0.3, 1, out=twinkle)
+    rgb += twinkle[:, np.newaxis]
+
+    rgb *= 256
+    return rgb
+
+
+#-------------------------------------------------------------------------------
+# pattern
+
+@register
+class NyanCat(Pattern):
+    """A sparkly rainbow which washes across the LEDs every few seconds."""
 
-print '    sending pixels forever (control-c to exit)...'
-print
+    name = 'nyan_cat'
 
-n_pixels = len(coordinates)
-random_values = [random.random() for ii in range(n_pixels)]
-start_time = time.time()
-while True:
-    t = time.time() - start_time
-    pixels = [pixel_color(t*0.6, coord, ii, n_pixels, random_values) for ii, coord in enumerate(coordinates)]
-    client.put_pixels(pixels, channel=0)
-    time.sleep(1 / options.fps)
+    def setup(self, layout):
+        self.coords = layout
+        self.state = init_state(layout)
 
+    def render(self, t):
+        return render(t*0.6, self.coords, self.state)
@@ -0,0 +1,221 @@
+"""Run patterns from the render_routines library against an OPC server.
+
+    python_clients/run_pattern.py lava_lamp --layout layouts/wall.json
+    python_clients/run_pattern.py miami nyan_cat --cycle 30 --layout layouts/wall.json
+    python_clients/run_pattern.py --list
+
+"""
+
+from __future__ import division
+import itertools
+import optparse
+import sys
+import threading
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import numpy as np
+
+import beat_clock
+import dmx_output
+import frame_clock
+import layout_cache
+import opc
+import osc_dispatch
+import sampling_profiler
+import stage_timers
+from render_routines import PATTERNS, get_pattern
+
+
+def load_targets(path):
+    """Read fan-out targets for opc.FanoutClient from a json file like
+
+        [{"start": 0,   "stop": 512,  "server": "10.0.0.2:7890", "channel": 1},
+         {"start": 512, "stop": 1024, "server": "10.0.0.3:7890", "channel": 1}]
+
+    """
+    targets = {}
+    for item in json.load(open(path)):
+        targets[(item['start'], item['stop'])] = (item['server'], item.get('channel', 0))
+    return targets
+
+
+class Runner(object):
+    """Renders one pattern at a time onto a layout and sends it to a client.
+
+    The current pattern can be replaced while running with set_pattern(),
+    for example from a control thread.  The new pattern is set up before it
+    is swapped in, so the render loop never sees a half-built pattern.
+
+    Patterns are rendered for the time of the frame clock, with the
+    musical position from beats, a beat_clock.BeatClock.
+
+    """
+
+    def __init__(self, client, layout, fps=20, channel=0, time_mode=frame_clock.FIXED,
+                 timers=None, beats=None):
+        self.client = client
+        self.layout = layout
+        self.clock = frame_clock.FrameClock(fps, mode=time_mode)
+        self.beats = beats or beat_clock.BeatClock()
+        self.channel = channel
+        self.pattern = None
+        self.timers = timers or stage_timers.StageTimers(enabled=False)
+        self.timers.add_counter('clock_dropped', lambda: self.clock.dropped)
+
+    def set_pattern(self, name):
+        """Set up the pattern registered as name and make it the current one."""
+        pattern = get_pattern(name)()
+        pattern.setup(self.layout)
+        self.pattern = pattern
+        return pattern
+
+    def run(self, names, cycle=None):
+        """Render and send frames forever.
+
+        names: the patterns to show
+        cycle: if set, switch to the next pattern in names every cycle seconds
+
+        """
+        names = itertools.cycle(names)
+        self.set_pattern(next(names))
+        next_swap = cycle
+        timers = self.timers
+        while True:
+            t = self.beats.at(self.clock.tick())
+            start = timers.now()
+            if cycle and t >= next_swap:
+                self.set_pattern(next(names))
+                next_swap += cycle
+            pixels = self.pattern.render(t)
+            start = timers.lap('render', start)
+            self.client.put_pixels(pixels, channel=self.channel)
+            timers.lap('put_pixels', start)
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] pattern [pattern ...]')
+    parser.add_option('-l', '--layout', dest='layout',
+                        action='store', type='string',
+                        help='layout file')
+    parser.add_option('-n', '--pixel_count', dest='pixel_count', default=0,
+                        action='store', type='int',
+                        help='number of pixels, for patterns that ignore the layout')
+    parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
+                        action='store', type='string',
+                        help='ip and port of server, or an E1.31 or Art-Net URL such as '
+                             'sacn:///1 or artnet://2.0.0.10/0 (see dmx_output.py)')
+    parser.add_option('--skip-unchanged', dest='skip_unchanged', action='store_true',
+                        help="don't resend identical frames, except as a keepalive once a second")
+    parser.add_option('--fanout', dest='fanout',
+                        action='store', type='string',
+                        help='json file splitting the layout across several servers, '
+                             'used instead of --server')
+    parser.add_option('-f', '--fps', dest='fps', default=20,
+                        action='store', type='int',
+                        help='frames per second')
+    parser.add_option('-t', '--time', dest='time_mode', default=frame_clock.FIXED,
+                        action='store', type='choice', choices=frame_clock.MODES,
+                        help='fixed: time advances exactly 1/fps per frame, '
+                             'wall: time follows the clock (default fixed)')
+    parser.add_option('--threaded', dest='threaded', action='store_true',
+                        help='send from a background thread, dropping frames '
+                             'the server is too slow for')
+    parser.add_option('-c', '--cycle', dest='cycle',
+                        action='store', type='float',
+                        help='seconds to show each pattern before switching to the next')
+    parser.add_option('-b', '--bpm', dest='bpm', default=120,
+                        action='store', type='float',
+                        help='the tempo patterns can lock to (default 120)')
+    parser.add_option('-o', '--osc', dest='osc',
+                        action='store', type='string',
+                        help='ip:port to listen for OSC on, for /tempo/tap, /tempo/bpm, '
+                             '/tempo/nudge and /tempo/reset')
+    parser.add_option('--list', dest='list', action='store_true',
+                        help='list the available patterns and exit')
+    parser.add_option('--profile', dest='profile', default=0,
+                        action='store', type='float',
+                        help='on SIGUSR1, profile the render loop for this many seconds '
+                             'and write a collapsed-stack file')
+    parser.add_option('--stats', dest='stats',
+                        action='store', type='string',
+                        help='time each stage of every frame and serve the stats: '
+                             'tcp:PORT for text on localhost, udp:IP:PORT to push json')
+
+    options, args = parser.parse_args(argv)
+
+    if options.list:
+        for name in sorted(PATTERNS):
+            print('    %-16s %s' % (name, PATTERNS[name].__doc__))
+        return
+
+    if not args:
+        parser.error('you must name at least one pattern, see --list')
+    for name in args:
+        if name not in PATTERNS:
+            parser.error('unknown pattern %r, see --list' % name)
+    if not options.layout and not options.pixel_count:
+        parser.error('you must specify a layout file using --layout')
+
+    if options.layout:
+        # patterns do their math in float64, the cache stores float32
+        layout = layout_cache.load_layout(options.layout).astype(float)
+    else:
+        layout = np.zeros((options.pixel_count, 3))
+
+    if options.profile:
+        sampling_profiler.install(seconds=options.profile)
+
+    timers = stage_timers.StageTimers(enabled=bool(options.stats))
+    if options.stats:
+        try:
+            stage_timers.start_endpoint(timers, options.stats)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if options.fanout:
+        server = 'the servers in %s' % options.fanout
+        client = opc.FanoutClient(load_targets(options.fanout))
+    elif options.server.startswith(tuple(scheme + ':' for scheme in dmx_output.SCHEMES)):
+        server = options.server
+        try:
+            client = dmx_output.client_from_url(options.server, timers=timers)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        server = options.server
+        client = opc.Client(options.server, threaded=options.threaded,
+                            skip_unchanged=options.skip_unchanged, timers=timers)
+    if client.can_connect():
+        print('    connected to %s' % server)
+    else:
+        # can't connect, but keep running in case the server appears later
+        print('    WARNING: could not connect to %s' % server)
+
+    beats = beat_clock.BeatClock(options.bpm)
+    if options.osc:
+        # tempo changes are tiny, so the OSC server can have a thread of its own
+        host, _, port = options.osc.rpartition(':')
+        dispatcher = osc_dispatch.Dispatcher()
+        beats.map_osc(dispatcher)
+        threading.Thread(target=osc_dispatch.serve_forever,
+                         args=(dispatcher, (host or '0.0.0.0', int(port))),
+                         name='osc-server', daemon=True).start()
+        print('    listening for tempo control over OSC on %s' % options.osc)
+    print()
+
+    print('    sending pixels forever (control-c to exit)...')
+    print()
+
+    runner = Runner(client, layout, fps=options.fps, time_mode=options.time_mode,
+                    timers=timers, beats=beats)
+    try:
+        runner.run(args, cycle=options.cycle)
+    except KeyboardInterrupt:
+        print('    %s' % runner.clock.format_stats())
+        if options.threaded or options.fanout:
+            print('    frames dropped by the sender: %s' % (client.frames_dropped,))
+        client.close()
+        sys.exit(0)
@@ -13,72 +13,18 @@ First start the gl simulator using, for example, the included "wall" layout
     make
     bin/gl_server layouts/wall.json
 
-Then run this script in another shell to send colors to the simulator
+Then run this pattern in another shell to send colors to the simulator
 
-    python_clients/spatial_stripes.py --layout layouts/wall.json
+    python_clients/run_pattern.py spatial_stripes --layout layouts/wall.json
 
 """
 
 from __future__ import division
-import time
-import sys
-import optparse
-try:
-    import json
-except ImportError:
-    import simplejson as json
-
-import opc
-import color_utils
-
-
-#-------------------------------------------------------------------------------
-# command line
-
-parser = optparse.OptionParser()
-parser.add_option('-l', '--layout', dest='layout',
-                    action='store', type='string',
-                    help='layout file')
-parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
-                    action='store', type='string',
-                    help='ip and port of server')
-parser.add_option('-f', '--fps', dest='fps', default=20,
-                    action='store', type='int',
-                    help='frames per second')
-
-options, args = parser.parse_args()
-
-if not options.layout:
-    parser.print_help()
-    print
-    print 'ERROR: you must specify a layout file using --layout'
-    print
-    sys.exit(1)
-
-
-#-------------------------------------------------------------------------------
-# parse layout file
-
-print
-print '    parsing layout file'
-print
+import numpy as np
 
-coordinates = []
-for item in json.load(open(options.layout)):
-    if 'point' in item:
-        coordinates.append(tuple(item['point']))
-
-
-#-------------------------------------------------------------------------------
-# connect to server
-
-client = opc.Client(options.server)
-if client.can_connect():
-    print '    connected to %s' % options.server
-else:
-    # can't connect, but keep running in case the server appears later
-    print '    WARNING: could not connect to %s' % options.server
-print
+import color_utils
+import color_utils_np
+from render_routines import Pattern, register
 
 
 #-------------------------------------------------------------------------------
@@ -119,16 +65,78 @@ def pixel_color(t, coord, ii, n_pixels):
 
 
 #-------------------------------------------------------------------------------
-# send pixels
+# frame function
+
+def init_state(coords):
+    """Precompute the per-pixel values that render() needs for a layout.
+
+    coords: an (N, 3) array of pixel positions
+
+    Returns a dict to pass back in to every render() call.
+
+    """
+    n_pixels = len(coords)
+    return {
+        'n_pixels': n_pixels,
+        'ii': np.arange(n_pixels),
+        'rgb': np.empty((n_pixels, 3)),
+    }
+
+def render_reference(t, coords, state):
+    """Compute a frame one pixel at a time with pixel_color.
+
+    This is the original implementation, kept as a reference for render().
+
+    """
+    n_pixels = state['n_pixels']
+    return np.array([pixel_color(t, tuple(coord), ii, n_pixels)
+                     for ii, coord in enumerate(coords)])
+
+def render(t, coords, state):
+    """Compute the colors of every pixel at once.
+
+    t: time in seconds since the program started.
+    coords: an (N, 3) array of pixel positions
+    state: the dict returned by init_state(coords)
+
+    Returns an (N, 3) array of colors in the range 0-255.  The array is
+    reused by the next call.
+
+    """
+    # make moving stripes for x, y, and z
+    x, y, z = coords.T
+    rgb = state['rgb']
+    r, g, b = rgb.T
+    color_utils_np.cos(x, offset=t / 4, period=1, minn=0, maxx=0.7, out=r)
+    color_utils_np.cos(y, offset=t / 4, period=1, minn=0, maxx=0.7, out=g)
+    color_utils_np.cos(z, offset=t / 4, period=1, minn=0, maxx=0.7, out=b)
+    color_utils_np.contrast(rgb, 0.5, 2, out=rgb)
+
+    # make a moving white dot showing the order of the pixels in the layout file
+    n_pixels = state['n_pixels']
+    spark_ii = (t*80) % n_pixels
+    spark_rad = 8
+    spark_val = color_utils_np.mod_dist(state['ii'], spark_ii, n_pixels)
+    spark_val = (spark_rad - spark_val) / spark_rad
+    color_utils_np.clamp(spark_val*2, 0, 1, out=spark_val)
+    rgb += spark_val[:, np.newaxis]
+
+    rgb *= 256
+    return rgb
+
+
+#-------------------------------------------------------------------------------
+# pattern
+
+@register
+class SpatialStripes(Pattern):
+    """Moving x, y, z stripes with a white spot following the layout order."""
 
-print '    sending pixels forever (control-c to exit)...'
-print
+    name = 'spatial_stripes'
 
-n_pixels = len(coordinates)
-start_time = time.time()
-while True:
-    t = time.time() - start_time
-    pixels = [pixel_color(t, coord, ii, n_pixels) for ii, coord in enumerate(coordinates)]
-    client.put_pixels(pixels, channel=0)
-    time.sleep(1 / options.fps)
+    def setup(self, layout):
+        self.coords = layout
+        self.state = init_state(layout)
 
+    def render(self, t):
+        return render(t, self.coords, self.state)
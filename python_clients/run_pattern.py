@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+"""Run one or more patterns from render_routines against an OPC server.
+
+To run:
+First start the gl simulator using, for example, the included "wall" layout
+
+    make
+    bin/gl_server layouts/wall.json
+
+Then run a pattern in another shell to send colors to the simulator
+
+    python_clients/run_pattern.py lava_lamp --layout layouts/wall.json
+
+Use --list to see the available patterns.
+
+"""
+
+from render_routines import runner
+
+if __name__ == '__main__':
+    runner.main()
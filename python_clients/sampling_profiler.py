@@ -0,0 +1,146 @@
+"""A sampling profiler which can be switched on in a running show.
+
+profile.run() slows a renderer down so much that what it measures is no
+longer the show.  This profiler instead looks at the render thread's stack
+from a background thread a few hundred times a second, counts how often
+each stack is seen, and after a while writes the counts out as collapsed
+stacks, one line per stack:
+
+    run_pattern.py:<module>;runner.py:main;runner.py:Runner.run;lava_lamp.py:render;color_utils_np.py:cos 214
+
+which flamegraph.pl, speedscope and similar tools turn into a flame graph.
+Time spent waiting for the next frame shows up under FrameClock.tick.
+
+Install it once at start-up, then trigger it from outside while the show
+runs:
+
+    profiler = sampling_profiler.install(seconds=10)
+    ...
+    $ kill -USR1 <pid>      # profile the next 10 seconds
+
+or from an OSC handler with profiler.start() or profiler.osc_handler.  Each
+run writes profile-<pid>-<time>.folded in the profiler's directory.
+
+"""
+
+from __future__ import division
+import os
+import signal
+import sys
+import threading
+import time
+
+
+def frame_name(code):
+    # co_qualname, Python 3.11 and up, includes the class of a method
+    name = getattr(code, 'co_qualname', code.co_name)
+    return '%s:%s' % (os.path.basename(code.co_filename), name)
+
+
+class SamplingProfiler(object):
+
+    def __init__(self, thread_id=None, interval=0.005, directory='.', seconds=10):
+        """Create a profiler for the thread with thread_id, by default the
+        current one, sampling every interval seconds, for seconds a run."""
+        self.thread_id = thread_id or threading.get_ident()
+        self.seconds = seconds
+        self.interval = interval
+        self.directory = directory
+        self.running = False
+        self.samples = 0
+        self.last_path = None
+        self._counts = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, seconds=None):
+        """Sample for seconds, by default the profiler's, then write the
+        stacks.  Returns False if a run is already going."""
+        if seconds is None:
+            seconds = self.seconds
+        with self._lock:
+            if self.running:
+                return False
+            self.running = True
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(seconds,),
+                                            name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        """End the current run early.  Its stacks are still written."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self, seconds):
+        counts = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        current_frames = sys._current_frames
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = current_frames().get(self.thread_id)
+            if frame is None:
+                break  # the thread has gone
+            # code objects are cheap to collect; they are named when written
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            stack = tuple(stack)
+            counts[stack] = counts.get(stack, 0) + 1
+            samples += 1
+            del frame
+
+        self._counts = counts
+        self.samples = samples
+        self.last_path = self.write(counts)
+        self.running = False
+
+    def write(self, counts, path=None):
+        """Write counts as collapsed stacks, root first, and return the path."""
+        if path is None:
+            path = os.path.join(self.directory, 'profile-%d-%s.folded'
+                                % (os.getpid(), time.strftime('%Y%m%d-%H%M%S')))
+        folded = {}
+        for stack, count in counts.items():
+            line = ';'.join(frame_name(code) for code in reversed(stack))
+            folded[line] = folded.get(line, 0) + count
+        with open(path, 'w') as f:
+            for line, count in sorted(folded.items()):
+                f.write('%s %d\n' % (line, count))
+        return path
+
+    def osc_handler(self, address, *args):
+        """An OSC handler(address, *args) which starts a run.
+
+        A first argument of 0, as a button sends on release, is ignored;
+        any other is a trigger.  An optional second argument gives the
+        seconds, otherwise the profiler's are used.
+
+        """
+        if args and not args[0]:
+            return
+        self.start(float(args[1]) if len(args) > 1 and args[1] > 0 else None)
+
+
+def install(seconds=10, signum=getattr(signal, 'SIGUSR1', None), directory='.', verbose=True):
+    """Profile the calling thread for seconds whenever the process gets signum.
+
+    Must be called from the main thread.  Returns the SamplingProfiler.
+
+    """
+    profiler = SamplingProfiler(directory=directory, seconds=seconds)
+
+    def handler(signum, frame):
+        if profiler.start() and verbose:
+            print('    profiling for %g seconds...' % seconds)
+
+    if signum is not None:
+        signal.signal(signum, handler)
+        if verbose:
+            print('    kill -%s %d to profile for %g seconds'
+                  % (signal.Signals(signum).name[3:], os.getpid(), seconds))
+    return profiler
@@ -1,55 +1,260 @@
 #!/usr/bin/env python
-"""A minimal test pattern.  Use this to measure your maximum frame rate."""
+"""A load generator for OPC servers.  Use this to measure your maximum frame rate.
 
+Opens --connections connections to the server, each sending frames of
+--num_pixels pixels on --channels channels, as fast as possible or at
+--fps frames per second per connection, a frame being one message on
+each channel.  Every second it prints the frames and megabytes per
+second achieved across all connections and the time put_message took to
+hand each message to the kernel, which grows when the server can't keep
+up:
+
+    python_clients/speed_test.py -n 512
+    python_clients/speed_test.py -s 10.0.0.2:7890 -n 1000 --connections 4 --channels 8 --fps 60
+
+The frames are the old test pattern:
+
+    First pixel will flash on and off every 10 frames.
+    Second pixel will flash on and off every 100 frames.
+    Third pixel will flash on and off every 1000 frames.
+
+and a bright pixel runs along the strip, changing color each time round.
+Each frame is patched into a packed message in place, so the generator
+spends its time sending rather than packing.
+
+"""
+
+from __future__ import division
+import collections
 import optparse
-import sys
+import threading
 import time
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import numpy as np
 
+import frame_clock
 import opc
 
+BLACK_WHITE = [b'\x00\x00\x00', b'\x02\x02\x02']
+RGB_BRIGHT = [b'\xff\x00\x00', b'\x00\xff\x00', b'\x00\x00\xff']
+RGB_DIM = [b'\x01\x00\x00', b'\x00\x01\x00', b'\x00\x00\x01']
+
+LATENCY_SAMPLES = 100000  # the most recent send times kept for percentiles
+
+
+class TestPattern(object):
+    """The flashing test pattern, patched into a reused OPC message."""
+
+    def __init__(self, n_pixels, channel):
+        self.n_pixels = n_pixels
+        self.message = bytearray(4 + n_pixels * 3)
+        self.message[0] = channel
+        self.message[2:4] = (n_pixels * 3).to_bytes(2, 'big')
+        self.frame = 0
+        self._lit = None
+
+    def _set(self, pixel, color):
+        self.message[4 + pixel * 3:7 + pixel * 3] = color
+
+    def next_frame(self):
+        """Advance to the next frame and return the message."""
+        frame, n = self.frame, self.n_pixels
+        lap, pixel = divmod(frame, n)
+        if pixel == 0:
+            self.message[4:] = RGB_DIM[lap % 3] * n
+        elif self._lit is not None:
+            self._set(self._lit, RGB_DIM[lap % 3])
+        self._set(pixel, RGB_BRIGHT[lap % 3])
+        self._lit = pixel
+        for ii, period in enumerate((10, 100, 1000)[:n]):
+            self._set(ii, BLACK_WHITE[(frame % period) // (period // 2)])
+        self.frame += 1
+        return self.message
+
+
+class Latencies(object):
+    """The count, total and maximum of send times in ns, and the most recent
+    of them for percentiles, so a long run takes bounded memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.recent = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        self.max = max(self.max, ns)
+        self.recent.append(ns)
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.recent.extend(other.recent)
+
+
+class Connection(threading.Thread):
+    """Sends frames on one connection, recording how long each send took."""
+
+    def __init__(self, server, n_pixels, channels, fps, stop):
+        threading.Thread.__init__(self, daemon=True)
+        self.client = opc.Client(server)
+        self.patterns = [TestPattern(n_pixels, channel) for channel in channels]
+        self.fps = fps
+        self.stop = stop
+        self.lock = threading.Lock()
+        self.latencies = Latencies()  # per message since the last collect()
+        self.frames = 0  # rounds of every channel sent
+        self.bytes = 0
+        self.failed = 0
+
+    def run(self):
+        clock = frame_clock.FrameClock(self.fps) if self.fps else None
+        perf_counter_ns = time.perf_counter_ns
+        while not self.stop.is_set():
+            if clock:
+                clock.tick()
+            sent = 0
+            for pattern in self.patterns:
+                message = pattern.next_frame()
+                start = perf_counter_ns()
+                ok = self.client.put_message(message)
+                elapsed = perf_counter_ns() - start
+                with self.lock:
+                    if ok:
+                        self.latencies.add(elapsed)
+                        self.bytes += len(message)
+                        sent += 1
+                    else:
+                        self.failed += 1
+            if sent == len(self.patterns):
+                with self.lock:
+                    self.frames += 1
+            else:
+                time.sleep(0.1)  # don't spin while the server is away
+        self.client.close()
+
+    def collect(self):
+        """Return (frames, bytes, failed, latencies) since the last collect()."""
+        with self.lock:
+            counts = self.frames, self.bytes, self.failed, self.latencies
+            self.frames = self.bytes = self.failed = 0
+            self.latencies = Latencies()
+        return counts
+
+
+class Totals(object):
+
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+        self.failed = 0
+        self.latencies = Latencies()
+
+    def add(self, frames, n_bytes, failed, latencies):
+        self.frames += frames
+        self.bytes += n_bytes
+        self.failed += failed
+        self.latencies.merge(latencies)
+
+    def summary(self, elapsed):
+        """Frames and bytes per second, and send times in ms: the mean and
+        max of every message, and percentiles of the most recent."""
+        latencies = self.latencies
+        recent = np.array(latencies.recent or [0]) / 1e6
+        return {
+            'fps': self.frames / elapsed,
+            'mbps': self.bytes / elapsed / 1e6,
+            'failed': self.failed,
+            'mean_ms': latencies.total / max(latencies.count, 1) / 1e6,
+            'p50_ms': float(np.percentile(recent, 50)),
+            'p99_ms': float(np.percentile(recent, 99)),
+            'max_ms': latencies.max / 1e6,
+        }
+
+
+def format_summary(summary):
+    return ('%(fps)9.1f frames/s %(mbps)8.2f MB/s  send mean %(mean_ms).3f ms  '
+            'p50 %(p50_ms).3f ms  p99 %(p99_ms).3f ms  max %(max_ms).3f ms  '
+            '%(failed)d failed' % summary)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('-n', '--num_pixels', dest='num_pixels', default=100,
+                        action='store', type='int', help='number of pixels per channel')
+    parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
+                        action='store', type='string', help='server IP and port')
+    parser.add_option('-f', '--fps', dest='fps', default=0,
+                        action='store', type='int',
+                        help='frames per second per connection (default 0: unbounded)')
+    parser.add_option('-m', '--connections', dest='connections', default=1,
+                        action='store', type='int', help='number of connections')
+    parser.add_option('-c', '--channels', dest='channels', default=1,
+                        action='store', type='int',
+                        help='channels per connection, sent as channels 1..C '
+                             '(default 1: channel 0)')
+    parser.add_option('-t', '--seconds', dest='seconds', default=0,
+                        action='store', type='float',
+                        help='stop after this many seconds (default 0: until control-c)')
+    parser.add_option('-o', '--output', dest='output',
+                        action='store', type='string',
+                        help='json file to save the overall results to')
+    options, args = parser.parse_args()
+
+    for name in ('num_pixels', 'connections', 'channels'):
+        if getattr(options, name) < 1:
+            parser.error('--%s must be at least 1' % name)
+    if options.num_pixels * 3 > 0xffff:
+        parser.error('at most %d pixels fit in one OPC message' % (0xffff // 3))
+    channels = [0] if options.channels == 1 else list(range(1, options.channels + 1))
+
+    stop = threading.Event()
+    connections = [Connection(options.server, options.num_pixels, channels, options.fps, stop)
+                   for ii in range(options.connections)]
+    if not connections[0].client.can_connect():
+        print('WARNING: could not connect to %s' % options.server)
+
+    print('Testing %d connections x %d channels x %d pixels %s (Ctrl-C to quit)...'
+          % (options.connections, len(channels), options.num_pixels,
+             'at %d fps' % options.fps if options.fps else 'unbounded'))
+    for connection in connections:
+        connection.start()
+
+    totals = Totals()
+    start = last = time.monotonic()
+    try:
+        while not options.seconds or last - start < options.seconds:
+            time.sleep(1.0)
+            interval = Totals()
+            for connection in connections:
+                interval.add(*connection.collect())
+            now = time.monotonic()
+            print(format_summary(interval.summary(now - last)))
+            totals.add(interval.frames, interval.bytes, interval.failed, interval.latencies)
+            last = now
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for connection in connections:
+        connection.join()
+
+    summary = totals.summary(max(last - start, 1e-9))
+    summary.update(connections=options.connections, channels=len(channels),
+                   num_pixels=options.num_pixels, target_fps=options.fps)
+    print()
+    print('overall:')
+    print(format_summary(summary))
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(summary, f, indent=1, sort_keys=True)
+
 
-parser = optparse.OptionParser()
-parser.add_option('-n', '--num_pixels', dest='num_pixels', default=100,
-                    action='store', type='int', help='number of pixels')
-parser.add_option('-s', '--server', dest='server', default='127.0.0.1:7890',
-                    action='store', type='string', help='server IP and port')
-parser.add_option('-f', '--fps', dest='fps', default=1e9,
-                    action='store', type='int', help='frames per second')
-
-options, args = parser.parse_args()
-client = opc.Client(options.server)
-
-black_white = [(0, 0, 0), (2, 2, 2)]
-rgb_bright = [(255, 0, 0), (0, 255, 0), (0, 0, 255)]
-red_pixels = [(1, 0, 0)] * options.num_pixels
-green_pixels = [(0, 1, 0)] * options.num_pixels
-blue_pixels = [(0, 0, 1)] * options.num_pixels
-arrays = [red_pixels, green_pixels, blue_pixels]
-frame = 0
-start_time, start_frame = time.time(), frame
-
-print 'First pixel will flash on and off every 10 frames.'
-print 'Second pixel will flash on and off every 100 frames.'
-print 'Third pixel will flash on and off every 1000 frames.'
-print
-print 'Testing %d pixels (Ctrl-C to quit)...' % options.num_pixels
-
-while True:
-    for pixels, bright in zip(arrays, rgb_bright):
-        dim = pixels[0]
-        for i in range(options.num_pixels):
-            pixels[i] = bright
-            pixels[0] = black_white[(frame % 10)/5]
-            pixels[1] = black_white[(frame % 100)/50]
-            pixels[2] = black_white[(frame % 1000)/500]
-            client.put_pixels(pixels, 0)
-            pixels[i] = dim
-            frame += 1
-            if frame % 100 == 0:
-                now = time.time()
-                if now - start_time >= 1.0:
-                    fps = (frame - start_frame) / (now - start_time)
-                    sys.stdout.write('%7.1f fps\r' % fps)
-                    sys.stdout.flush()
-                    start_time, start_frame = now, frame
-        pixels[0] = pixels[1] = pixels[2] = dim
+if __name__ == '__main__':
+    main()
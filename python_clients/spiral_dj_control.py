@@ -16,21 +16,49 @@ Then run this script in another shell to send colors to the simulator
 
 from __future__ import division
 import argparse
+import asyncio
 import colorutils
 import math
-import multiprocessing
-import OSC
 import sys
-import time
 
-import profile
-
-from multiprocessing import Queue
-from Queue import Empty
-from pprint import pprint
 
 import opc
+import beat_clock
 import color_utils
+import control_store
+import frame_clock
+import midi_input
+import modulation
+import osc_dispatch
+import sampling_profiler
+import stage_timers
+
+#-------------------------------------------------------------------------------
+# The OSC addresses of the TouchOSC layout, and their initial values
+
+COLOR_INPUTS = [
+              "/LeftChooser/1/1", "/LeftChooser/1/2", "/LeftChooser/1/3", "/LeftChooser/1/4", "/LeftChooser/1/5",
+              "/RightChooser/1/1", "/RightChooser/1/2", "/RightChooser/1/3", "/RightChooser/1/4", "/RightChooser/1/5",
+              "/LeftBlack/1", "/LeftBlack/2", "/LeftBlack/3", "/LeftBlack/4",
+              "/RightBlack/1", "/RightBlack/2", "/RightBlack/3", "/RightBlack/4",
+              "/LeftRed/1", "/LeftRed/2", "/RightRed/1", "/RightRed/2",
+              "/LeftGreen/1", "/LeftGreen/2", "/RightGreen/1", "/RightGreen/2",
+              "/LeftBlue/1", "/LeftBlue/2", "/RightBlue/1", "/RightBlue/2"]
+CONTROL_INPUTS = [
+              "/LeftBright", "/RightBright", "/XFader",
+              "/RedLevel", "/GreenLevel", "/BlueLevel", "/Saturation",
+              "/Strobe", "/StrobeRate/1/1", "/StrobeRate/1/2", "/StrobeRate/1/3", "/StrobeRate/1/4",
+              ]
+
+DEFAULT_COLOR_PARAM = 1.51
+DEFAULT_CONTROL_PARAM = 1.0
+
+
+def default_controls():
+    """Return a command dictionary holding the initial value of every input."""
+    controls = dict((name, DEFAULT_COLOR_PARAM) for name in COLOR_INPUTS)
+    controls.update((name, DEFAULT_CONTROL_PARAM) for name in CONTROL_INPUTS)
+    return controls
 
 
 def main():
@@ -38,128 +66,138 @@ def main():
     # Process command line args
     parser = argparse.ArgumentParser(description='An OSC server which sends RGB values to an OPC server')
     parser.add_argument('--listen_ip', default='0.0.0.0', help='')
-    parser.add_argument('--listen_port', default=5006, help='')
+    parser.add_argument('--listen_port', default=5006, type=int, help='')
     parser.add_argument('--send_ip', default='0.0.0.0', help='')
     parser.add_argument('--send_port', default='7890', help='')
-    parser.add_argument('--pixel_count', default=512, help='')
-    parser.add_argument('--fps', default=24, help='')
+    parser.add_argument('--pixel_count', default=512, type=int, help='')
+    parser.add_argument('--fps', default=24, type=int, help='')
+    parser.add_argument('--stats', default=None,
+                        help='time each stage of every frame and serve the stats: '
+                             'tcp:PORT for text on localhost, udp:IP:PORT to push json')
+    parser.add_argument('--slew', default=4.0, type=float,
+                        help='how fast controls follow their faders, in units per second '
+                             '(0 for no smoothing)')
+    parser.add_argument('--lfo', action='append', default=[], metavar='SHAPE:RATE[b]:INPUT:DEPTH',
+                        help='modulate INPUT with a sine, saw, square or random LFO of RATE '
+                             'cycles per second, or per beat with b, for example '
+                             'sine:0.1:/LeftBlack/1:0.5; may be repeated')
+    parser.add_argument('--bpm', default=120.0, type=float,
+                        help='the starting tempo for beat-synced LFOs; tap it in with /tempo/tap')
+    parser.add_argument('--midi', default=None, metavar='SOURCE',
+                        help='MIDI input: a raw MIDI device such as /dev/snd/midiC1D0, '
+                             '- for stdin, a .mid file to play, or port:NAME with python-rtmidi')
+    parser.add_argument('--midi_map', action='append', default=[],
+                        metavar='cc|note:CHANNEL:NUMBER=INPUT[:LOW:HIGH]',
+                        help='set INPUT from a MIDI controller or note, for example '
+                             'cc:1:7=/LeftBright:0:2; may be repeated')
+    parser.add_argument('--profile_seconds', default=10, type=float,
+                        help='seconds to profile for on SIGUSR1 or the /Profile OSC message')
     args = parser.parse_args()
 
+    profiler = sampling_profiler.install(seconds=args.profile_seconds)
+
+    timers = stage_timers.StageTimers(enabled=bool(args.stats))
+    if args.stats:
+        stage_timers.start_endpoint(timers, args.stats)
+
+    # the smoothed and modulated values the renderer uses
+    engine = modulation.Modulation(default_controls(), slew=args.slew or float('inf'))
+    for spec in args.lfo:
+        try:
+            engine.add_route(spec)
+        except ValueError as e:
+            parser.error(str(e))
+
+    # the show's tempo, from OSC taps or MIDI clock
+    beats = beat_clock.BeatClock(args.bpm)
+
+    # MIDI controls go through the OSC dispatcher, and MIDI clock sets the tempo
+    midi = None
+    if args.midi:
+        try:
+            midi = midi_input.MidiInput(midi_input.ControlMap(args.midi_map))
+        except ValueError as e:
+            parser.error(str(e))
+        midi.start(args.midi)
+        beats.follow = midi.clock
+
+    try:
+        asyncio.run(run(args, engine, beats, midi, profiler, timers))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+async def run(args, engine, beats, midi, profiler, timers):
+    """Receive OSC, render and send, all in one event loop."""
     #-------------------------------------------------------------------------------
     # Connect to OPC server
     OPC_IP_PORT = "%s:%s" % (args.send_ip, args.send_port)
-    client = opc.Client(OPC_IP_PORT)
-    if not client.can_connect():
+    client = opc.AsyncClient(OPC_IP_PORT)
+    if not await client.connect():
         # can't connect, but keep running in case the server appears later
-        print('WARNING: could not connect to %s' % IP_PORT)
-        sys.exit(1)
-
-    #------------------------------------------------------------------------------
-    # OSC server Setup
-    # pyOSC module implementation
-    osc_server = OSC.OSCServer((args.listen_ip, args.listen_port))
-    osc_server.addDefaultHandlers()
-    osc_server.timeout=0.0001
-    #osc_server.timeout=0
-    print("Listening for OSC on {}".format("%s:%d" % osc_server.server_address))
-    print("Connecting to OPC on {}".format(OPC_IP_PORT))
-    print('control-c to exit...')
+        print('WARNING: could not connect to %s' % OPC_IP_PORT)
 
     #-------------------------------------------------------------------------------
     # Number of Pixels, and Frame rate
     n_pixels = args.pixel_count   # number of pixels in the layout
     fps = args.fps                # frames per second
 
+    # a TouchOSC button sends 1 when pressed and 0 when released
+    def on_profile(address, pressed=1.0, *rest):
+        if pressed:
+            profiler.start(args.profile_seconds)
+
     #------------------------------------------------------------------------------
-    # initialize the queue
-    command_queue = Queue()
-    # initialize the command dictionary
-    command_dict = {}
-
-    color_inputs = [
-                  "/LeftChooser/1/1", "/LeftChooser/1/2", "/LeftChooser/1/3", "/LeftChooser/1/4", "/LeftChooser/1/5",
-                  "/RightChooser/1/1", "/RightChooser/1/2", "/RightChooser/1/3", "/RightChooser/1/4", "/RightChooser/1/5",
-                  "/LeftBlack/1", "/LeftBlack/2", "/LeftBlack/3", "/LeftBlack/4",
-                  "/RightBlack/1", "/RightBlack/2", "/RightBlack/3", "/RightBlack/4",
-                  "/LeftRed/1", "/LeftRed/2", "/RightRed/1", "/RightRed/2",
-                  "/LeftGreen/1", "/LeftGreen/2", "/RightGreen/1", "/RightGreen/2",
-                  "/LeftBlue/1", "/LeftBlue/2", "/RightBlue/1", "/RightBlue/2"]
-    control_inputs = [
-                  "/LeftBright", "/RightBright" "/XFader",
-                  "/RedLevel", "/GreenLevel", "/BlueLevel", "/Saturation",
-                  "/Strobe", "/StrobeRate/1/1", "/StrobeRate/1/2", "/StrobeRate/1/3", "/StrobeRate/1/4",
-                  ]
-
-    all_inputs = color_inputs + control_inputs
-    DEFAULT_COLOR_PARAM = 1.51
-    DEFAULT_CONTROL_PARAM = 1.0
-    osc_handler = mypartial(osc_color_handler, cmd_queue=command_queue)
-    # register all osc_inputs as OSC handlers
-    for color_input in color_inputs:
-        # register the handler with the command queue callback
-        osc_server.addMsgHandler(color_input, osc_handler)
-        # add in an initial value to all controls
-        command_dict[color_input] = DEFAULT_COLOR_PARAM
-
-    for control_input in control_inputs:
-        # register the handler with the command queue callback
-        osc_server.addMsgHandler(control_input, osc_handler)
-        # add in an initial value to all controls
-        command_dict[control_input] = DEFAULT_CONTROL_PARAM
-
-    # start the OSC serer in the background
-    server_job = multiprocessing.Process(target=osc_server.serve_forever)
-    server_job.start()
-
-    dt = 1.0 / fps
-    # could also initialize this in control thread and put it on command queue,
-    # though that would leave control_params possibly uninitialized.
-    last_render = time.time()
-    while True:
-    #for x in range(0, 250):
-        command_dict = queue_to_dict(command_queue, command_dict, all_inputs)
-        render_time = last_render = time.time()
-        pixels = render_pixels(args.pixel_count, render_time, all_inputs, command_dict)
-        # send the pixlels to the OPC server
-        client.put_pixels(pixels, channel=0)
-        time.sleep( dt )
+    # the control store, holding the latest value of every input
+    controls = control_store.ControlStore(default_controls())
+    transport = None
+
+    try:
+        all_inputs = COLOR_INPUTS + CONTROL_INPUTS
+        # every input is written straight to the store, a whole bundle at a
+        # time; bundles timed for the future wait for their frame
+        dispatcher = osc_dispatch.Dispatcher(scheduled=True)
+        dispatcher.map_store(controls)
+        dispatcher.map('/Profile', on_profile)
+        beats.map_osc(dispatcher)
+
+        # OSC is received in this event loop, while the clock waits for the next frame
+        transport = await osc_dispatch.serve(dispatcher, (args.listen_ip, args.listen_port))
+        print("Listening for OSC on {}".format("%s:%d" % (args.listen_ip, args.listen_port)))
+        print("Connecting to OPC on {}".format(OPC_IP_PORT))
+        print('control-c to exit...')
+
+        # render_pixels has always animated against the real clock
+        clock = frame_clock.FrameClock(fps, mode=frame_clock.WALL)
+        timers.add_counter('clock_dropped', lambda: clock.dropped)
+        timers.add_counter('osc_late_bundles', lambda: dispatcher.late)
+        timers.add_counter('frames_dropped', lambda: client.frames_dropped)
+        while True:
+        #for x in range(0, 250):
+            render_time = beats.at(await clock.tick_async())
+            start = timers.now()
+            dispatcher.apply_due(clock.next_deadline)
+            if midi:
+                dispatcher.dispatch(midi.drain())
+            engine.set_targets(controls.snapshot())
+            engine.update(render_time, render_time.beats)
+            command_dict = engine.as_dict()
+            start = timers.lap('control', start)
+            pixels = render_pixels(n_pixels, render_time, all_inputs, command_dict)
+            start = timers.lap('render', start)
+            # send the pixlels to the OPC server
+            await client.put_pixels(pixels, channel=0)
+            timers.lap('put_pixels', start)
+    finally:
+        # stop receiving before the store the dispatcher writes to goes away
+        if transport is not None:
+            transport.close()
+        controls.close()
 
 # clamps a number between a low and high range
 # useful to restrict values from being beyond value ranges
 def num_clamp(num, low, high):
-    return max(low, min(num, max))
-
-# function which emulates the functionality of partial, but does not use the
-# module. This was added because OSC was raising the error
-# OSC.OSCServerError: Message callback '<functools.partial object at 0x102633578>' is not callable
-# when using functools.partial
-def mypartial(f,*bind_a,**bind_kw):
-    def wrapped(*a,**kw):
-        all_kw = bind_kw.copy()
-        all_kw.update(kw)
-        return f(*(bind_a+a),**all_kw)
-    return wrapped
-
-
-# the callback used by OSC
-def osc_color_handler(path, tags, data, source, cmd_queue):
-    # args ==  path, [tags], args, source
-    # tags will contain 'fff'
-    # args is a OSCMessage with data
-    # source is where the message came from (in case you need to reply)
-    cmd_queue.put((path, data))
-
-
-# convert OSC messages in the queue to values in a dictionary
-def queue_to_dict(cmd_queue, cmd_dict, osc_inputs):
-    try:
-        name, value = cmd_queue.get(timeout=0.00001)
-        if name in osc_inputs:
-            cmd_dict[name] = value[0]
-    except Empty:
-        pass
-    return cmd_dict
-
+    return max(low, min(num, high))
 
 # render the pixels, based on raver_plaid
 def render_pixels(n_pixels, frame_time, osc_inputs, control_dict):
@@ -218,5 +256,4 @@ def render_pixels(n_pixels, frame_time, osc_inputs, control_dict):
 
 
 if __name__ == '__main__':
-    #profile.run('main()')
     main()
@@ -0,0 +1,193 @@
+"""Per-stage timing for render loops, with a stats endpoint.
+
+A StageTimers records how long each stage of every frame took, in
+nanoseconds from time.perf_counter_ns, into a fixed-size ring buffer per
+stage, so it never grows however long the show runs:
+
+    timers = stage_timers.StageTimers()
+    while True:
+        t = clock.tick()
+        start = timers.now()
+        drain_controls()
+        start = timers.lap('control', start)
+        pixels = pattern.render(t)
+        start = timers.lap('render', start)
+        client.put_pixels(pixels)   # opc.Client(..., timers=timers) records pack and send
+        timers.lap('send', start)
+
+lap() records the time since start and returns the time now, to start the
+next stage from.  A disabled StageTimers replaces now() and lap() with
+functions that do nothing, so the calls can stay in the loop for good.
+
+Counters such as dropped frames are read when a report is made:
+
+    timers.add_counter('clock_dropped', lambda: clock.dropped)
+
+The report, with rolling percentiles of the last capacity frames of each
+stage, can be served as plain text over TCP:
+
+    timers.serve(7899)              # then: nc localhost 7899
+
+or pushed as json in a UDP datagram every few seconds:
+
+    timers.push('10.0.0.5:7898', interval=5)
+
+"""
+
+from __future__ import division
+import socket
+import threading
+import time
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+class Ring(object):
+    """The last capacity values added, in a preallocated array."""
+
+    def __init__(self, capacity):
+        self.values = np.zeros(capacity, dtype=np.int64)
+        self.capacity = capacity
+        self.count = 0  # values ever added
+
+    def add(self, value):
+        self.values[self.count % self.capacity] = value
+        self.count += 1
+
+    def recent(self):
+        """Return the values held, in no particular order."""
+        return self.values[:min(self.count, self.capacity)]
+
+
+def _zero():
+    return 0
+
+
+def _ignore(name, start):
+    return 0
+
+
+class StageTimers(object):
+
+    def __init__(self, capacity=1024, enabled=True):
+        """Create timers keeping the last capacity durations of each stage."""
+        self.capacity = capacity
+        self.stages = {}    # name -> Ring of durations in ns
+        self.counters = {}  # name -> function returning a number
+        self.enabled = enabled
+        if enabled:
+            self.now = time.perf_counter_ns
+            self.lap = self._lap
+        else:
+            self.now = _zero
+            self.lap = _ignore
+
+    def _lap(self, name, start, perf_counter_ns=time.perf_counter_ns):
+        # Ring.add inlined: this runs several times a frame
+        now = perf_counter_ns()
+        ring = self.stages.get(name) or self._add_stage(name)
+        ring.values[ring.count % ring.capacity] = now - start
+        ring.count += 1
+        return now
+
+    def _add_stage(self, name):
+        ring = self.stages[name] = Ring(self.capacity)
+        return ring
+
+    def record(self, name, duration_ns):
+        """Record a duration measured some other way."""
+        if self.enabled:
+            (self.stages.get(name) or self._add_stage(name)).add(duration_ns)
+
+    def add_counter(self, name, read):
+        """Include read(), for example a count of dropped frames, in reports."""
+        self.counters[name] = read
+
+    def as_dict(self):
+        """Return {'stages': {name: stats}, 'counters': {name: value}}.
+
+        Stage stats are in milliseconds, over the most recent frames.
+
+        """
+        stages = {}
+        for name, ring in list(self.stages.items()):
+            values = ring.recent() / 1e6
+            if not len(values):
+                continue
+            stats = {'count': ring.count, 'mean_ms': float(values.mean()),
+                     'max_ms': float(values.max())}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats['p%d_ms' % p] = float(value)
+            stages[name] = stats
+        counters = dict((name, read()) for name, read in list(self.counters.items()))
+        return {'stages': stages, 'counters': counters}
+
+    def report(self):
+        """Return the stats as a plain text table."""
+        stats = self.as_dict()
+        columns = ['p%d_ms' % p for p in PERCENTILES] + ['max_ms']
+        lines = ['%-10s %9s %9s' % ('stage', 'count', 'mean ms')
+                 + ''.join('%9s' % c.replace('_ms', ' ms') for c in columns)]
+        for name, s in sorted(stats['stages'].items()):
+            lines.append('%-10s %9d %9.3f' % (name, s['count'], s['mean_ms'])
+                         + ''.join('%9.3f' % s[c] for c in columns))
+        for name, value in sorted(stats['counters'].items()):
+            lines.append('%-20s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """Serve report() to anyone who connects to host:port, from a thread."""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, port))
+        listener.listen(4)
+
+        def run():
+            while True:
+                conn, addr = listener.accept()
+                try:
+                    conn.sendall(self.report().encode())
+                except socket.error:
+                    pass
+                finally:
+                    conn.close()
+
+        thread = threading.Thread(target=run, name='stage-timers-serve', daemon=True)
+        thread.start()
+        return listener
+
+    def push(self, ip_port, interval=5.0):
+        """Send as_dict() as json to ip_port in a UDP datagram every interval
+        seconds, from a thread."""
+        ip, port = ip_port.split(':')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    sock.sendto(json.dumps(self.as_dict()).encode(), (ip, int(port)))
+                except socket.error:
+                    pass
+
+        thread = threading.Thread(target=run, name='stage-timers-push', daemon=True)
+        thread.start()
+        return sock
+
+
+def start_endpoint(timers, spec):
+    """Serve or push the stats of timers as given by a command line option:
+    tcp:PORT serves text on localhost, udp:IP:PORT pushes json."""
+    kind, _, address = spec.partition(':')
+    if kind == 'tcp' and address:
+        timers.serve(int(address))
+    elif kind == 'udp' and address:
+        timers.push(address)
+    else:
+        raise ValueError('stats endpoint must be tcp:PORT or udp:IP:PORT, not %r' % spec)